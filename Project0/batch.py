@@ -0,0 +1,114 @@
+# batch.py
+#
+# ICS 33 Fall 2025
+# Project 0: History of Modern
+#
+# A module containing tools that check the safety of many chessboards at once,
+# rather than calling any_queens_unsafe on each QueensState in turn.
+#
+# Boards can be given either as QueensStates or as the column of the queen in
+# each row (with a negative number for a row without one).  In the latter
+# case, when NumPy is installed, the boards are given (or converted into) a
+# two-dimensional array with one board per row, and every board is checked in
+# the same handful of array operations: for each of the columns, diagonals
+# and anti-diagonals, the keys identifying the line each queen is on are
+# sorted within each board, after which queens sharing a line are adjacent,
+# and the number of attacking pairs falls out of the lengths of those runs.
+# Without NumPy, the same counts are made one board at a time.
+
+from collections import namedtuple
+from collections.abc import Sequence
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from queens import QueensState
+
+
+
+BatchSafety = namedtuple('BatchSafety', ['unsafe', 'conflicts'])
+
+BatchSafety.__doc__ = 'The safety of each of a batch of chessboards, in the order they were given.'
+BatchSafety.unsafe.__doc__ = 'Whether any queens on each chessboard are unsafe'
+BatchSafety.conflicts.__doc__ = 'The number of pairs of queens on each chessboard that can capture each other'
+
+
+
+def evaluate_safety(boards) -> BatchSafety:
+    """Determines, for each of the given chessboards, whether any of its queens
+    are unsafe and how many pairs of queens can capture each other.
+
+    The boards are either a sequence of QueensStates or a sequence of
+    sequences (such as a two-dimensional NumPy array) listing the column of
+    the queen in each row, or a negative number for a row without one.  When
+    they're given as a NumPy array, the results are NumPy arrays, too;
+    otherwise, they're lists."""
+    if numpy is not None and isinstance(boards, numpy.ndarray):
+        return _evaluate_array(boards)
+
+    if len(boards) > 0 and all(isinstance(board, QueensState) for board in boards):
+        conflicts = [board.total_conflicts() for board in boards]
+    elif numpy is not None and len(boards) > 0 and len({len(board) for board in boards}) == 1:
+        result = _evaluate_array(numpy.asarray(boards))
+        return BatchSafety(result.unsafe.tolist(), result.conflicts.tolist())
+    else:
+        conflicts = [_attacking_pairs(_placed(board)) for board in boards]
+
+    return BatchSafety([count > 0 for count in conflicts], conflicts)
+
+
+def _placed(columns: Sequence[int]):
+    return ((row, column) for row, column in enumerate(columns) if column >= 0)
+
+
+def _attacking_pairs(queens) -> int:
+    # Counts the pairs of the given (row, column) positions sharing a column,
+    # diagonal or anti-diagonal.  (No two of them can share a row.)
+    counts = {}
+    pairs = 0
+    for row, column in queens:
+        for line in ((1, column), (2, row - column), (3, row + column)):
+            count = counts.get(line, 0)
+            pairs += count
+            counts[line] = count + 1
+    return pairs
+
+
+def _evaluate_array(boards) -> BatchSafety:
+    if boards.ndim != 2:
+        raise ValueError('boards must be a two-dimensional array')
+
+    count, rows = boards.shape
+    if count == 0 or rows == 0:
+        conflicts = numpy.zeros(count, dtype = numpy.int64)
+        return BatchSafety(conflicts > 0, conflicts)
+
+    columns = boards.astype(numpy.int64, copy = False)
+    row_numbers = numpy.arange(rows, dtype = numpy.int64)
+    empty = columns < 0
+
+    # Each empty row needs keys that can't match any other key, so they're
+    # given distinct values below the smallest key any queen can have.
+    smallest = -int(columns.max()) - 1
+    filler = smallest - 1 - row_numbers
+
+    conflicts = numpy.zeros(count, dtype = numpy.int64)
+    for keys in (columns, row_numbers - columns, row_numbers + columns):
+        conflicts += _equal_pairs(numpy.where(empty, filler, keys))
+
+    return BatchSafety(conflicts > 0, conflicts)
+
+
+def _equal_pairs(keys) -> 'numpy.ndarray':
+    # Counts, within each row of the array, the pairs of equal keys.  After
+    # sorting, each key is equal to all of those between it and the start of
+    # its run, so summing each key's distance from the start of its run
+    # counts each equal pair exactly once.
+    ordered = numpy.sort(keys, axis = 1)
+    positions = numpy.arange(ordered.shape[1])
+    run_starts = numpy.ones(ordered.shape, dtype = bool)
+    run_starts[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    start_of_run = numpy.maximum.accumulate(numpy.where(run_starts, positions, 0), axis = 1)
+    return (positions - start_of_run).sum(axis = 1)
@@ -0,0 +1,181 @@
+# bench_queens.py
+#
+# ICS 33 Fall 2025
+# Project 0: History of Modern
+#
+# Times the basic QueensState operations -- construction, with_queens_added,
+# with_queens_removed, has_queen and any_queens_unsafe -- across a sweep of
+# board sizes and queen counts, for both QueensState and BitboardQueensState,
+# and writes the results as JSON.  The queens are placed by a seeded random
+# number generator, so every run measures the same boards.  Construction is
+# also timed on a few boards of its own, from a handful of queens to a hundred
+# thousand, both by itself and followed by the first query that needs the
+# state's line counts, which are only counted when first needed.
+#
+# Each measurement runs an operation enough times to take at least a minimum
+# amount of time, repeats that several times, and reports the fastest
+# repetition as seconds per operation, which is the figure least disturbed by
+# whatever else the machine happens to be doing.
+#
+# Given the JSON from an earlier run, it also reports every measurement that
+# got slower by more than a given factor, exiting with status 1 if there were
+# any, so it can be used to catch regressions between releases.  Run it from
+# the Project0 directory:
+#
+#     python -m benchmarks.bench_queens --output results.json
+#     python -m benchmarks.bench_queens --compare results.json
+
+import argparse
+import json
+from pathlib import Path
+import platform
+import random
+import sys
+import timeit
+
+from queens import QueensState, BitboardQueensState, Position
+
+
+
+_SIZES = [8, 64, 512, 4096]
+_DENSITIES = [0.25, 1.0]
+_CLASSES = [QueensState, BitboardQueensState]
+
+# The (size, queens) of the boards on which construction is timed by itself.
+# BitboardQueensState keeps a bitmask as wide as the board for every row with
+# a queen in it, which on the largest board would take more than a gigabyte,
+# so it's timed only on the others.
+_CONSTRUCTION_BOARDS = {
+    QueensState: [(8, 7), (1000, 1000), (100_000, 100_000)],
+    BitboardQueensState: [(8, 7), (1000, 1000)],
+}
+
+
+
+def _random_queens(n: int, count: int, rng: random.Random) -> list[Position]:
+    # One queen in each of a random selection of rows, in a random column,
+    # which is the shape of the partial boards a search would produce.
+    return [Position(row, rng.randrange(n)) for row in sorted(rng.sample(range(n), count))]
+
+
+def _time_per_call(function, repeat: int, min_time: float) -> float:
+    timer = timeit.Timer(function)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    return min(timer.repeat(repeat = repeat, number = number)) / number
+
+
+def _benchmark_board(cls: type, n: int, count: int, repeat: int, min_time: float,
+                     rng: random.Random) -> dict[str, float]:
+    queens = _random_queens(n, count, rng)
+    state = cls(n, n, tuple(queens))
+    free = next(Position(row, 0) for row in range(n) if not state.has_queen(Position(row, 0)))
+    present = queens[len(queens) // 2]
+    probes = [Position(rng.randrange(n), rng.randrange(n)) for _ in range(100)]
+
+    return {
+        'construct': _time_per_call(lambda: cls(n, n, tuple(queens)), repeat, min_time),
+        'with_queens_added': _time_per_call(lambda: state.with_queens_added([free]), repeat, min_time),
+        'with_queens_removed': _time_per_call(lambda: state.with_queens_removed([present]), repeat, min_time),
+        'has_queen': _time_per_call(lambda: [state.has_queen(p) for p in probes], repeat, min_time) / len(probes),
+        'any_queens_unsafe': _time_per_call(state.any_queens_unsafe, repeat, min_time),
+    }
+
+
+def _benchmark_construction(cls: type, n: int, count: int, repeat: int, min_time: float,
+                            rng: random.Random) -> dict[str, float]:
+    queens = tuple(Position(row, rng.randrange(n)) for row in range(count))
+    return {
+        'construct': _time_per_call(lambda: cls(n, n, queens), repeat, min_time),
+        'construct_and_check': _time_per_call(lambda: cls(n, n, queens).any_queens_unsafe(), repeat, min_time),
+    }
+
+
+def _report(result: dict) -> None:
+    print(f"{result['class']:>20} n={result['size']:<6} queens={result['queens']:<6} "
+          + ' '.join(f'{name}={seconds * 1e6:.2f}us' for name, seconds in result['seconds'].items()),
+          file = sys.stderr)
+
+
+def run(sizes: list[int], repeat: int, min_time: float, seed: int) -> dict:
+    """Runs the benchmarks for the given board sizes, returning the results in
+    the form that's written as JSON."""
+    rng = random.Random(seed)
+    results = []
+    for cls in _CLASSES:
+        for n in sizes:
+            for density in _DENSITIES:
+                count = max(1, min(n - 1, int(n * density)))
+                timings = _benchmark_board(cls, n, count, repeat, min_time, rng)
+                results.append({'class': cls.__name__, 'size': n, 'queens': count, 'seconds': timings})
+                _report(results[-1])
+
+    construction = []
+    for cls in _CLASSES:
+        for n, count in _CONSTRUCTION_BOARDS[cls]:
+            timings = _benchmark_construction(cls, n, count, repeat, min_time, rng)
+            construction.append({'class': cls.__name__, 'size': n, 'queens': count, 'seconds': timings})
+            _report(construction[-1])
+
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'seed': seed,
+        'repeat': repeat,
+        'min_time': min_time,
+        'results': results,
+        'construction': construction,
+    }
+
+
+def regressions(baseline: dict, current: dict, tolerance: float) -> list[str]:
+    """Returns a description of each measurement in the current results that is
+    slower than the same measurement in the baseline by more than the given
+    factor."""
+    found = []
+    for table in ('results', 'construction'):
+        before = {(r['class'], r['size'], r['queens']): r['seconds'] for r in baseline.get(table, [])}
+        for result in current[table]:
+            key = (result['class'], result['size'], result['queens'])
+            for name, seconds in result['seconds'].items():
+                old = before.get(key, {}).get(name)
+                if old and seconds > old * tolerance:
+                    found.append(f'{key[0]} n={key[1]} queens={key[2]} {name}: '
+                                 f'{old * 1e6:.2f}us -> {seconds * 1e6:.2f}us ({seconds / old:.2f}x)')
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = 'Benchmark QueensState operations.')
+    parser.add_argument('--sizes', type = int, nargs = '+', default = _SIZES)
+    parser.add_argument('--repeat', type = int, default = 5)
+    parser.add_argument('--min-time', type = float, default = 0.02,
+                        help = 'shortest time, in seconds, that each repetition should run (default: 0.02)')
+    parser.add_argument('--seed', type = int, default = 33)
+    parser.add_argument('--output', type = Path, help = 'where to write the JSON results (default: stdout)')
+    parser.add_argument('--compare', type = Path, help = 'JSON results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type = float, default = 1.25,
+                        help = 'how many times slower counts as a regression (default: 1.25)')
+    args = parser.parse_args()
+
+    current = run(args.sizes, args.repeat, args.min_time, args.seed)
+    text = json.dumps(current, indent = 2)
+    if args.output is not None:
+        args.output.write_text(text + '\n', encoding = 'utf-8')
+    elif args.compare is None:
+        print(text)
+
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text(encoding = 'utf-8'))
+        found = regressions(baseline, current, args.tolerance)
+        for line in found:
+            print(f'REGRESSION {line}')
+        if found:
+            raise SystemExit(1)
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# memory_search_tree.py
+#
+# ICS 33 Fall 2025
+# Project 0: History of Modern
+#
+# Measures how much memory a depth-N chain of QueensStates occupies when every
+# ancestor is kept alive, as it is along the current path of a backtracking
+# search.  Each state in the chain has one more queen than its parent.  For
+# comparison, the same chain is also built by copying a flat dict of queens
+# and a flat dict of line counts at every step, which is how QueensState
+# stored its board before its storage became persistent.
+#
+# Run it from the Project0 directory:
+#
+#     python -m benchmarks.memory_search_tree 250 500 1000
+
+import sys
+import tracemalloc
+
+from queens import QueensState, Position
+
+
+
+def _chain_of_states(depth: int) -> list[QueensState]:
+    states = [QueensState(depth, depth)]
+    for row in range(depth):
+        states.append(states[-1].with_queens_added([Position(row, (2 * row) % depth)]))
+    return states
+
+
+def _chain_of_copies(depth: int) -> list[tuple[dict, dict]]:
+    chain = [({}, {})]
+    for row in range(depth):
+        queens, line_counts = chain[-1]
+        queens = queens.copy()
+        line_counts = line_counts.copy()
+        column = (2 * row) % depth
+        queens[Position(row, column)] = None
+        for line in ((0, row), (1, column), (2, row - column), (3, row + column)):
+            line_counts[line] = line_counts.get(line, 0) + 1
+        chain.append((queens, line_counts))
+    return chain
+
+
+def _measure(build, depth: int) -> int:
+    tracemalloc.start()
+    try:
+        kept = build(depth)
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del kept
+    return size
+
+
+def main(depths: list[int]) -> None:
+    print(f'{"depth":>8} {"persistent (KiB)":>18} {"copying (KiB)":>15} {"ratio":>7}')
+    for depth in depths:
+        persistent = _measure(_chain_of_states, depth)
+        copying = _measure(_chain_of_copies, depth)
+        print(f'{depth:>8} {persistent / 1024:>18.1f} {copying / 1024:>15.1f} {copying / persistent:>7.2f}')
+
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100, 250, 500, 1000])
@@ -0,0 +1,59 @@
+# memory_states.py
+#
+# ICS 33 Fall 2025
+# Project 0: History of Modern
+#
+# Measures how much memory many independent QueensStates occupy, the way a
+# search holding a large table of states would: each state is built from
+# Position objects created afresh by the caller, as search code typically
+# does, even though the same few positions turn up over and over.  The
+# states are the solutions to the eight-queens problem, built repeatedly.
+#
+# The table of interned positions is shared by every state, so it's emptied
+# before each measurement, which then includes the positions that its states
+# put into it, rather than charging them all to whichever class is measured
+# first.  The states are also built once before anything is measured, so
+# that nothing allocated the first time they're built is charged to either.
+#
+# Run it from the Project0 directory:
+#
+#     python -m benchmarks.memory_states 100
+
+import sys
+import tracemalloc
+
+import queens
+from queens import QueensState, BitboardQueensState, Position
+import solver
+
+
+
+def _build_states(cls: type, copies: int) -> list[QueensState]:
+    solutions = [[(q.row, q.column) for q in state.queens()] for state in solver.iter_solutions(8)]
+    return [cls(8, 8, tuple(Position(row, column) for row, column in solution))
+            for _ in range(copies)
+            for solution in solutions]
+
+
+def _measure(cls: type, copies: int) -> tuple[int, int]:
+    queens._interned_positions.clear()
+    tracemalloc.start()
+    try:
+        states = _build_states(cls, copies)
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return len(states), size
+
+
+def main(copies: int) -> None:
+    _build_states(QueensState, 1)
+    print(f'{"class":>20} {"states":>8} {"total (KiB)":>12} {"per state (bytes)":>18}')
+    for cls in [QueensState, BitboardQueensState]:
+        count, size = _measure(cls, copies)
+        print(f'{cls.__name__:>20} {count:>8} {size / 1024:>12.1f} {size / count:>18.1f}')
+
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
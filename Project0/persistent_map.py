@@ -0,0 +1,307 @@
+# persistent_map.py
+#
+# ICS 33 Fall 2025
+# Project 0: History of Modern
+#
+# A module containing PersistentMap, an immutable mapping in which "modified"
+# copies share almost all of their structure with the original.  It's
+# implemented as a hash array mapped trie (HAMT): a tree whose nodes each
+# consume five bits of a key's hash, storing only the children that are
+# actually present alongside a bitmap recording which ones those are.  Setting
+# or deleting a key copies only the nodes along one root-to-leaf path, which
+# is rarely more than a handful of nodes long, while everything else is
+# shared.
+#
+# QueensState uses this to store its queens and line counts, so that a long
+# chain of derived states doesn't hold a full copy of the board at every step.
+
+from collections.abc import Iterator, Mapping
+from typing import Self
+
+
+
+_BITS_PER_LEVEL = 5
+_LEVEL_MASK = (1 << _BITS_PER_LEVEL) - 1
+_HASH_BITS = 64
+_HASH_MASK = (1 << _HASH_BITS) - 1
+
+
+# Within a node's array, a key of _SUBNODE indicates that the value alongside
+# it is a child node, rather than a value stored under that key.
+_SUBNODE = object()
+_MISSING = object()
+
+
+def _hash(key: object) -> int:
+    return hash(key) & _HASH_MASK
+
+
+
+class _BitmapNode:
+    # A node holds a bitmap with one bit for each of the 32 possible values of
+    # its five bits of the hash, along with a flat tuple of alternating keys
+    # and values, one pair for each bit set in the bitmap.
+    __slots__ = ('bitmap', 'array')
+
+    def __init__(self, bitmap: int, array: tuple) -> None:
+        self.bitmap = bitmap
+        self.array = array
+
+
+    def find(self, shift: int, h: int, key: object, default: object) -> object:
+        bit = 1 << ((h >> shift) & _LEVEL_MASK)
+        if not self.bitmap & bit:
+            return default
+        i = 2 * (self.bitmap & (bit - 1)).bit_count()
+        k = self.array[i]
+        if k is _SUBNODE:
+            return self.array[i + 1].find(shift + _BITS_PER_LEVEL, h, key, default)
+        elif k is key or k == key:
+            return self.array[i + 1]
+        else:
+            return default
+
+
+    def assoc(self, shift: int, h: int, key: object, value: object) -> tuple['_BitmapNode', bool]:
+        # Returns the node with the key set to the value, along with whether
+        # the key was newly added (as opposed to replaced).
+        bit = 1 << ((h >> shift) & _LEVEL_MASK)
+        i = 2 * (self.bitmap & (bit - 1)).bit_count()
+        array = self.array
+
+        if not self.bitmap & bit:
+            return _BitmapNode(self.bitmap | bit, array[:i] + (key, value) + array[i:]), True
+
+        k, v = array[i], array[i + 1]
+        if k is _SUBNODE:
+            child, added = v.assoc(shift + _BITS_PER_LEVEL, h, key, value)
+            if child is v:
+                return self, False
+            return _BitmapNode(self.bitmap, array[:i + 1] + (child,) + array[i + 2:]), added
+        elif k is key or k == key:
+            if v is value:
+                return self, False
+            return _BitmapNode(self.bitmap, array[:i + 1] + (value,) + array[i + 2:]), False
+        else:
+            child = _pair_node(shift + _BITS_PER_LEVEL, _hash(k), k, v, h, key, value)
+            return _BitmapNode(self.bitmap, array[:i] + (_SUBNODE, child) + array[i + 2:]), True
+
+
+    def without(self, shift: int, h: int, key: object) -> '_BitmapNode | None':
+        # Returns the node with the key removed, the node itself if the key
+        # isn't present, or None if removing the key would leave it empty.
+        bit = 1 << ((h >> shift) & _LEVEL_MASK)
+        if not self.bitmap & bit:
+            return self
+        i = 2 * (self.bitmap & (bit - 1)).bit_count()
+        array = self.array
+
+        k, v = array[i], array[i + 1]
+        if k is _SUBNODE:
+            child = v.without(shift + _BITS_PER_LEVEL, h, key)
+            if child is v:
+                return self
+            elif child is None:
+                pass
+            elif len(child.array) == 2 and child.array[0] is not _SUBNODE:
+                # A child left holding a single key can be folded into this node.
+                return _BitmapNode(self.bitmap, array[:i] + child.array + array[i + 2:])
+            else:
+                return _BitmapNode(self.bitmap, array[:i + 1] + (child,) + array[i + 2:])
+        elif not (k is key or k == key):
+            return self
+
+        if self.bitmap == bit:
+            return None
+        return _BitmapNode(self.bitmap & ~bit, array[:i] + array[i + 2:])
+
+
+    def items(self) -> Iterator[tuple[object, object]]:
+        array = self.array
+        for i in range(0, len(array), 2):
+            if array[i] is _SUBNODE:
+                yield from array[i + 1].items()
+            else:
+                yield array[i], array[i + 1]
+
+
+
+class _CollisionNode:
+    # Once every bit of the hash has been consumed, keys whose hashes are
+    # entirely equal are kept in a flat tuple of alternating keys and values.
+    __slots__ = ('array',)
+
+    def __init__(self, array: tuple) -> None:
+        self.array = array
+
+
+    def _index_of(self, key: object) -> int:
+        array = self.array
+        for i in range(0, len(array), 2):
+            if array[i] is key or array[i] == key:
+                return i
+        return -1
+
+
+    def find(self, shift: int, h: int, key: object, default: object) -> object:
+        i = self._index_of(key)
+        return self.array[i + 1] if i >= 0 else default
+
+
+    def assoc(self, shift: int, h: int, key: object, value: object) -> tuple['_CollisionNode', bool]:
+        i = self._index_of(key)
+        if i < 0:
+            return _CollisionNode(self.array + (key, value)), True
+        elif self.array[i + 1] is value:
+            return self, False
+        else:
+            return _CollisionNode(self.array[:i + 1] + (value,) + self.array[i + 2:]), False
+
+
+    def without(self, shift: int, h: int, key: object) -> '_CollisionNode | None':
+        i = self._index_of(key)
+        if i < 0:
+            return self
+        elif len(self.array) == 2:
+            return None
+        else:
+            return _CollisionNode(self.array[:i] + self.array[i + 2:])
+
+
+    def items(self) -> Iterator[tuple[object, object]]:
+        array = self.array
+        for i in range(0, len(array), 2):
+            yield array[i], array[i + 1]
+
+
+
+def _pair_node(shift: int, h1: int, k1: object, v1: object, h2: int, k2: object, v2: object):
+    # Builds the smallest subtree, rooted at the given shift, that holds two
+    # keys whose hashes agree on every bit consumed above it.
+    if shift >= _HASH_BITS:
+        return _CollisionNode((k1, v1, k2, v2))
+
+    i1 = (h1 >> shift) & _LEVEL_MASK
+    i2 = (h2 >> shift) & _LEVEL_MASK
+    if i1 == i2:
+        return _BitmapNode(1 << i1, (_SUBNODE, _pair_node(shift + _BITS_PER_LEVEL, h1, k1, v1, h2, k2, v2)))
+    elif i1 < i2:
+        return _BitmapNode((1 << i1) | (1 << i2), (k1, v1, k2, v2))
+    else:
+        return _BitmapNode((1 << i1) | (1 << i2), (k2, v2, k1, v1))
+
+
+def _build(shift: int, entries: list[tuple[int, object, object]]):
+    # Builds a subtree from scratch, rooted at the given shift, holding the
+    # given (hash, key, value) entries, all of whose keys are distinct.
+    if shift >= _HASH_BITS:
+        return _CollisionNode(tuple(x for _, k, v in entries for x in (k, v)))
+
+    buckets = {}
+    for entry in entries:
+        buckets.setdefault((entry[0] >> shift) & _LEVEL_MASK, []).append(entry)
+
+    bitmap = 0
+    array = []
+    for index in sorted(buckets):
+        bitmap |= 1 << index
+        bucket = buckets[index]
+        if len(bucket) == 1:
+            array.append(bucket[0][1])
+            array.append(bucket[0][2])
+        else:
+            array.append(_SUBNODE)
+            array.append(_build(shift + _BITS_PER_LEVEL, bucket))
+    return _BitmapNode(bitmap, tuple(array))
+
+
+
+_EMPTY_NODE = _BitmapNode(0, ())
+
+
+
+class PersistentMap:
+    """An immutable mapping from hashable keys to values.  Rather than being
+    modified, a PersistentMap builds new maps with keys set or deleted, each of
+    which shares all but a few of its internal nodes with the original."""
+
+    __slots__ = ('_root', '_size')
+
+    def __init__(self, items: Mapping | None = None) -> None:
+        """Initializes the map to contain the keys and values in the given mapping,
+        or to be empty if no mapping is given."""
+        if items:
+            self._root = _build(0, [(_hash(k), k, v) for k, v in items.items()])
+            self._size = len(items)
+        else:
+            self._root = _EMPTY_NODE
+            self._size = 0
+
+
+    def __len__(self) -> int:
+        return self._size
+
+
+    def __contains__(self, key: object) -> bool:
+        return self._root.find(0, _hash(key), key, _MISSING) is not _MISSING
+
+
+    def __getitem__(self, key: object) -> object:
+        value = self._root.find(0, _hash(key), key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+
+    def __iter__(self) -> Iterator:
+        for key, _ in self._root.items():
+            yield key
+
+
+    def __repr__(self) -> str:
+        return f'PersistentMap({dict(self.items())!r})'
+
+
+    def __reduce__(self) -> tuple:
+        # The nodes mark their children with a sentinel compared by identity,
+        # which pickling or copying wouldn't preserve, and the layout of the
+        # nodes depends on hashes that can differ between processes, so a map
+        # is rebuilt from its keys and values instead.
+        return type(self), (dict(self.items()),)
+
+
+    def get(self, key: object, default: object = None) -> object:
+        """Returns the value associated with the given key, or the given default
+        if the key isn't present."""
+        return self._root.find(0, _hash(key), key, default)
+
+
+    def items(self) -> Iterator[tuple[object, object]]:
+        """Returns an iterator over the (key, value) pairs in the map, arranged in
+        no particular order."""
+        return self._root.items()
+
+
+    def set(self, key: object, value: object) -> Self:
+        """Builds a new map in which the given key is associated with the given
+        value, without modifying 'self' in any way."""
+        root, added = self._root.assoc(0, _hash(key), key, value)
+        if root is self._root:
+            return self
+        return self._with_root(root, self._size + 1 if added else self._size)
+
+
+    def delete(self, key: object) -> Self:
+        """Builds a new map in which the given key is not present, without modifying
+        'self' in any way.  Raises a KeyError if the key isn't present."""
+        root = self._root.without(0, _hash(key), key)
+        if root is self._root:
+            raise KeyError(key)
+        return self._with_root(root if root is not None else _EMPTY_NODE, self._size - 1)
+
+
+    def _with_root(self, root, size: int) -> Self:
+        m = object.__new__(type(self))
+        m._root = root
+        m._size = size
+        return m
@@ -17,9 +17,18 @@
 #
 # DO NOT MODIFY THE Position NAMEDTUPLE OR THE PROVIDED EXCEPTION CLASSES.
 
-from collections import namedtuple
+from collections import Counter, namedtuple
+from collections.abc import Callable, Iterator
+from functools import reduce
+import hashlib
+from itertools import chain
+from operator import xor
+import random
+import struct
 from typing import Self
 
+from persistent_map import PersistentMap
+
 
 
 Position = namedtuple('Position', ['row', 'column'])
@@ -59,25 +68,197 @@ class MissingQueenError(Exception):
 
 
 
+# Search code tends to create the same positions over and over again, so the
+# positions stored in QueensStates are interned: the first Position with a
+# given row and column is kept here, and any equal one is replaced by it.
+# Only positions in the first _INTERNED_SIDE rows and columns are kept, so the
+# table never holds more than _INTERNED_SIDE ** 2 of them, however large the
+# boards it's used with.  Positions given many at a time, which is how the
+# largest states are built, aren't interned at all, so they're freed along
+# with the states that hold them.
+_interned_positions: dict[Position, Position] = {}
+_INTERNED_SIDE = 256
+
+
+def intern_position(position: Position) -> Position:
+    """Returns a Position equal to the given one.  For a position within the
+    first 256 rows and columns, it's the same object for every equal position
+    passed to this function, so that equal positions share their memory; the
+    first Position passed in is the one kept."""
+    interned = _interned_positions.get(position)
+    if interned is None:
+        interned = position if type(position) is Position else Position(*position)
+        if 0 <= interned.row < _INTERNED_SIDE and 0 <= interned.column < _INTERNED_SIDE:
+            _interned_positions[interned] = interned
+    return interned
+
+
+def _intern_positions(positions: tuple[Position, ...]) -> list[Position]:
+    # Interns many positions at once, looking all of them up in one pass and
+    # then interning any that weren't found one at a time.
+    found = list(map(_interned_positions.get, positions))
+    if None in found:
+        found = [f if f is not None else intern_position(p) for f, p in zip(found, positions)]
+    return found
+
+
+
+# Each queen occupies one row, one column, one diagonal and one anti-diagonal.
+# QueensState counts the queens on each of these lines, keyed by a single
+# integer combining one of these kinds with the line's index (which may be
+# negative, in the case of a diagonal): four times the index plus the kind.
+# Plain integers are considerably smaller than pairs, which matters on huge
+# boards where nearly every queen has all four of its lines to itself.
+_ROW = 0
+_COLUMN = 1
+_DIAGONAL = 2
+_ANTI_DIAGONAL = 3
+
+
+def _lines_through(p: Position) -> tuple[int, int, int, int]:
+    return 4 * p.row + _ROW, 4 * p.column + _COLUMN, \
+        4 * (p.row - p.column) + _DIAGONAL, 4 * (p.row + p.column) + _ANTI_DIAGONAL
+
+
+# A QueensState's hash is built Zobrist-style: each position is given a
+# pseudorandom 64-bit key, and the hash is the exclusive-or of the keys of all
+# of the positions with queens in them.  Adding or removing a queen then
+# changes the hash by exclusive-oring in that one queen's key, so derived
+# states can update their parent's hash rather than computing it from
+# scratch.  The keys are computed from the row and column by a mixing
+# function (that of SplitMix64), rather than looked up in a table, so that
+# they're available on boards of any size.
+_KEY_MASK = (1 << 64) - 1
+
+
+def _mix(x: int) -> int:
+    x = (x + 0x9E3779B97F4A7C15) & _KEY_MASK
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _KEY_MASK
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _KEY_MASK
+    return x ^ (x >> 31)
+
+
+def _zobrist_key(p: Position) -> int:
+    return _mix(_mix(p.row & _KEY_MASK) ^ (p.column & _KEY_MASK))
+
+
+# Lists of positions at least this long are validated in bulk (see
+# QueensState._check_new_queens), which is slower for a handful of positions
+# but far faster for thousands of them.
+_BULK_CHECK_THRESHOLD = 32
+
+
+# QueensState.complete starts over after this many dead ends, then twice as
+# many, and so on.
+_FIRST_RESTART_DEAD_ENDS = 64
+
+
+def _symmetries(rows: int, columns: int) -> list[Callable[[int, int], tuple[int, int]]]:
+    # Returns the rotations and reflections that map a board with the given
+    # numbers of rows and columns onto itself, each as a function that maps
+    # a row and column to the row and column they move to.  A square board
+    # has eight of them; any other board has only the four that don't turn
+    # its rows into columns.
+    last_row = rows - 1
+    last_column = columns - 1
+    symmetries = [
+        lambda r, c: (r, c),
+        lambda r, c: (last_row - r, last_column - c),
+        lambda r, c: (last_row - r, c),
+        lambda r, c: (r, last_column - c),
+    ]
+    if rows == columns:
+        symmetries += [
+            lambda r, c: (c, r),
+            lambda r, c: (last_column - c, last_row - r),
+            lambda r, c: (c, last_row - r),
+            lambda r, c: (last_column - c, r),
+        ]
+    return symmetries
+
+
+
 class QueensState:
     """Immutably represents the state of a chessboard being used to assist in
-    solving the n-queens problem."""
+    solving the n-queens problem.
+
+    Alongside the queens themselves, a QueensState keeps a count of the queens
+    on every occupied row, column, diagonal and anti-diagonal, as well as the
+    number of pairs of queens that can capture each other.  A state built from
+    scratch keeps its queens in a plain dictionary and counts the lines only
+    once something asks about them, so building one costs little more than
+    validating its queens.  States derived via with_queens_added and
+    with_queens_removed inherit the counts from their parent and adjust them
+    only for the queens being added or removed.  The first time a state is
+    derived from, its queens and counts are moved into PersistentMaps, so a
+    derived state shares nearly all of its storage with its parent.
+
+    QueensStates are equal when they have the same numbers of rows and
+    columns and queens in the same positions, and they can be hashed, so
+    they can be used as keys in dictionaries and elements of sets.  Their
+    hash is computed the first time it's needed and, for derived states,
+    updated from their parent's hash if it had one, so hashing a state again
+    takes constant time.
+
+    Nothing a QueensState stores grows with the size of the chessboard, only
+    with the number of queens on it, so it's just as suitable for a board with
+    a million rows and columns and a few thousand queens as for a small one.
+    Every query looks up a handful of lines by hash, however big the board."""
+
+    __slots__ = ('_rows', '_columns', '_queens', '_line_counts', '_attacking_pairs', '_zobrist')
 
     def __init__(self, rows: int, columns: int, queens: tuple[Position, ...] | None = None) -> None:
         """Initializes the chessboard to have the given numbers of rows and columns,
-        with no queens occupying any of its cells."""
+        with queens occupying the given positions (if any)."""
         if not isinstance(rows, int) or not isinstance(columns, int) or rows <= 0 or columns <= 0:
             raise ValueError("rows and columns must be positive integers")
         self._rows = rows
         self._columns = columns
-        self._queens: tuple[Position, ...] = tuple(queens) if queens is not None else tuple()
+        self._queens = {}
+        queens = tuple(queens) if queens is not None else ()
+        self._check_new_queens(queens)
+        self._build(queens)
+
+
+    @classmethod
+    def _trusted(cls, rows: int, columns: int, queens: tuple[Position, ...]) -> Self:
+        # Builds a state without validating anything, for positions that are
+        # already known to be distinct and on the chessboard, such as those
+        # produced by a solver or taken from another valid state.
+        state = object.__new__(cls)
+        state._rows = rows
+        state._columns = columns
+        state._build(queens)
+        return state
+
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, QueensState):
+            return NotImplemented
+        return self._rows == other._rows \
+            and self._columns == other._columns \
+            and self._hash_key() == other._hash_key() \
+            and len(self._queens) == len(other._queens) \
+            and all(q in other._queens for q in self._queens)
+
+
+    def __hash__(self) -> int:
+        return hash((self._rows, self._columns, self._hash_key()))
+
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self._rows}, {self._columns}, {tuple(sorted(self._queens))!r})'
+
+
+    def rows(self) -> int:
+        """Returns the number of rows on the chessboard."""
+        return self._rows
+
+
+    def columns(self) -> int:
+        """Returns the number of columns on the chessboard."""
+        return self._columns
 
-        seen = set()
-        for q in self._queens:
-            self._check_in_bounds(q)
-            if q in seen:
-                raise DuplicateQueenError(q)
-            seen.add(q)
 
     def queen_count(self) -> int:
         """Returns the number of queens on the chessboard."""
@@ -99,43 +280,437 @@ class QueensState:
     def any_queens_unsafe(self) -> bool:
         """Returns True if any queens on the chessboard are unsafe (i.e., they can
         be captured by at least one other queen on the chessboard), or False otherwise."""
-        qs = self.queens()
-        for i in range(len(qs)):
-            q1 = qs[i]
-            for j in range(i + 1, len(qs)):
-                q2 = qs[j]
-                same_rows = q1.row == q2.row
-                same_columns = q1.column == q2.column
-                same_diags = abs(q1.row - q2.row) == abs(q1.column - q2.column)
-                if same_rows or same_columns or same_diags:
-                    return True
-        return False
+        if self._line_counts is None:
+            self._count_lines()
+        return self._attacking_pairs > 0
+
+
+    def conflicts_for(self, position: Position) -> int:
+        """Returns the number of queens on the chessboard that could capture a
+        queen in the given position, not counting any queen already there.
+        Raises a ValueError if the position isn't on the chessboard."""
+        self._check_in_bounds(position)
+        if self._line_counts is None:
+            self._count_lines()
+        attackers = sum(self._line_counts.get(line, 0) for line in _lines_through(position))
+        return attackers - 4 if position in self._queens else attackers
+
+
+    def unsafe_queens(self) -> list[Position]:
+        """Returns a list of the positions of the queens that can be captured by at
+        least one other queen on the chessboard, arranged in no particular order."""
+        if not self.any_queens_unsafe():
+            return []
+        return [q for q in self._queens if self.conflicts_for(q) > 0]
+
+
+    def total_conflicts(self) -> int:
+        """Returns the number of pairs of queens on the chessboard that can capture
+        each other."""
+        if self._line_counts is None:
+            self._count_lines()
+        return self._attacking_pairs
 
 
     def with_queens_added(self, positions: list[Position]) -> Self:
         """Builds a new QueensState with queens added in the given positions,
         without modifying 'self' in any way.  Raises a DuplicateQueenError when
         there is already a queen in at least one of the given positions."""
-        current = set(self._queens)
-        for q in positions:
-            self._check_in_bounds(q)
-            if q in current:
-                raise DuplicateQueenError(q)
-            current.add(q)
-        return QueensState(self._rows, self._columns, tuple(sorted(current)))
+        positions = tuple(positions)
+        self._check_new_queens(positions)
+        if len(positions) >= _BULK_CHECK_THRESHOLD and len(positions) * 4 >= len(self._queens):
+            # Adding this many queens one at a time would cost more than
+            # building the new state's bookkeeping from scratch, at the price
+            # of it sharing none of its storage with this one.
+            return type(self)._trusted(self._rows, self._columns, tuple(self._queens) + positions)
+        return self._derive(dict.fromkeys(map(intern_position, positions)), ())
 
 
     def with_queens_removed(self, positions: list[Position]) -> Self:
         """Builds a new QueensState with queens removed from the given positions,
         without modifying 'self' in any way.  Raises a MissingQueenError when there
         is no queen in at least one of the given positions."""
-        current = set(self._queens)
+        removed = {}
         for q in positions:
-            if q not in current:
+            if q not in self._queens or q in removed:
                 raise MissingQueenError(q)
-            current.remove(q)
-        return QueensState(self._rows, self._columns, tuple(sorted(current)))
+            removed[q] = None
+        return self._derive((), removed)
+
+
+    def complete(self) -> Self | None:
+        """Returns a completion of this chessboard: a chessboard with the same
+        queens plus one more queen in every row that doesn't have one, with no
+        queen able to capture any other.  Returns None if there is no such
+        completion, including when the queens already present are unsafe, or
+        when there are more rows than columns.
+
+        The search tries columns in a random order (though the same one every
+        time it's called on the same chessboard), and starts over with a new
+        order whenever it has hit more dead ends than it's allowed, allowing
+        twice as many each time, so that an unlucky order can't keep it busy
+        for long.  Boards of a thousand rows or so are typically completed in
+        a few seconds; far larger ones are better left to solver.solve."""
+        rng = random.Random(self._hash_key())
+        dead_ends = _FIRST_RESTART_DEAD_ENDS
+        while True:
+            search = self._search_completions(rng, dead_ends)
+            try:
+                return next(search)
+            except StopIteration as stop:
+                if not stop.value:
+                    return None
+            dead_ends *= 2
+
+
+    def iter_completions(self) -> Iterator[Self]:
+        """Generates every completion of this chessboard, as described in the
+        documentation for complete(), trying columns in order from left to
+        right.  Unlike complete(), it never starts over, so finding even the
+        first completion of a large board can take a very long time."""
+        yield from self._search_completions(None, None)
+
+
+    def _search_completions(self, rng: random.Random | None, max_dead_ends: int | None) -> Iterator[Self]:
+        # Generates completions of this chessboard, trying the columns of each
+        # row in random order if given a random number generator, or in order
+        # from left to right otherwise.  Gives up after hitting the given
+        # number of dead ends (if any), returning True if it did.
+        if self.any_queens_unsafe() or self._rows > self._columns:
+            return False
+
+        # The columns, diagonals and anti-diagonals occupied by queens are kept
+        # as bitmasks, with a diagonal's bit being its column minus its row
+        # (offset so as not to be negative) and an anti-diagonal's bit being
+        # its row plus its column.  Shifting them by an amount that depends on
+        # a row lines them up with the columns attacked in that row.
+        last_row = self._rows - 1
+        full = (1 << self._columns) - 1
+        columns = diagonals = anti_diagonals = 0
+        occupied_rows = set()
+        for q in self._queens:
+            occupied_rows.add(q.row)
+            columns |= 1 << q.column
+            diagonals |= 1 << (q.column - q.row + last_row)
+            anti_diagonals |= 1 << (q.row + q.column)
+
+        def safe_columns(row: int, columns: int, diagonals: int, anti_diagonals: int) -> int:
+            return full & ~(columns | (diagonals >> (last_row - row)) | (anti_diagonals >> row))
+
+        # A depth-first search, with each entry on the stack being a row being
+        # filled, the columns in it not yet tried, the other rows still to
+        # fill, the occupied lines, and the queens added so far (as a linked
+        # list of (position, rest) pairs, so that entries share it).  Each
+        # step fills whichever row has the fewest safe columns left, and an
+        # entry is abandoned as soon as any row has none, or, when there are
+        # exactly as many columns left as rows, as soon as any of those
+        # columns is unsafe in every row, since each of them will need a queen.
+        dead_ends = 0
+        stack = []
+        free_rows = [row for row in range(self._rows) if row not in occupied_rows]
+        entry = (free_rows, columns, diagonals, anti_diagonals, None)
+        while True:
+            free_rows, columns, diagonals, anti_diagonals, added = entry
+            if not free_rows:
+                positions = []
+                while added is not None:
+                    position, added = added
+                    positions.append(position)
+                yield self._derive(positions, ())
+            else:
+                best_index = -1
+                best_safe = full
+                best_count = self._columns + 1
+                reachable = columns
+                for index, row in enumerate(free_rows):
+                    safe = safe_columns(row, columns, diagonals, anti_diagonals)
+                    count = safe.bit_count()
+                    if count < best_count:
+                        best_index, best_safe, best_count = index, safe, count
+                        if count == 0:
+                            break
+                    reachable |= safe
+
+                columns_left = self._columns - columns.bit_count()
+                if best_count == 0 or (reachable != full and columns_left == len(free_rows)):
+                    dead_ends += 1
+                    if max_dead_ends is not None and dead_ends > max_dead_ends:
+                        return True
+                else:
+                    rest = free_rows[:best_index] + free_rows[best_index + 1:]
+                    stack.append((free_rows[best_index], best_safe, rest, columns, diagonals, anti_diagonals, added))
+
+            if not stack:
+                return False
+
+            # The next column to try in the row on top of the stack is its
+            # leftmost untried one or, when choosing randomly, the first
+            # untried one at or after a random column (wrapping around).
+            row, untried, rest, columns, diagonals, anti_diagonals, added = stack.pop()
+            if rng is None:
+                bit = untried & -untried
+            else:
+                after = untried & ~((1 << rng.randrange(self._columns)) - 1) or untried
+                bit = after & -after
+            if untried != bit:
+                stack.append((row, untried ^ bit, rest, columns, diagonals, anti_diagonals, added))
+            column = bit.bit_length() - 1
+            entry = (rest, columns | bit, diagonals | (1 << (column - row + last_row)),
+                     anti_diagonals | (1 << (row + column)), (intern_position(Position(row, column)), added))
+
+
+    def canonical(self) -> Self:
+        """Returns the canonical form of this chessboard: the same one for every
+        chessboard that is a rotation or reflection of it (including itself).
+        Boards that aren't square can only be reflected or rotated by 180
+        degrees, since a quarter-turn would change their shape."""
+        return self._canonical_state(self._canonical_positions())
+
+
+    def canonical_hash(self) -> int:
+        """Returns a 64-bit hash of the canonical form of this chessboard, which
+        is the same in every process, so it can be stored alongside a board."""
+        return self._canonical_hash(self._canonical_positions())
+
+
+    def _canonical_key(self) -> tuple[int, Self]:
+        # Returns both the canonical hash and the canonical form, finding the
+        # canonical positions only once for the two of them.
+        positions = self._canonical_positions()
+        return self._canonical_hash(positions), self._canonical_state(positions)
+
+
+    def _canonical_state(self, positions: list[tuple[int, int]]) -> Self:
+        return type(self)._trusted(self._rows, self._columns,
+                                   tuple(Position(row, column) for row, column in positions))
+
+
+    def _canonical_hash(self, positions: list[tuple[int, int]]) -> int:
+        digest = hashlib.blake2b(digest_size = 8)
+        digest.update(struct.pack('<QQ', self._rows, self._columns))
+        for row, column in positions:
+            digest.update(struct.pack('<QQ', row, column))
+        return int.from_bytes(digest.digest(), 'little')
+
+
+    def _canonical_positions(self) -> list[tuple[int, int]]:
+        # The canonical form is whichever rotation or reflection has the
+        # smallest sorted list of positions.
+        queens = [(q.row, q.column) for q in self._queens]
+        return min(sorted(symmetry(row, column) for row, column in queens)
+                   for symmetry in _symmetries(self._rows, self._columns))
+
 
     def _check_in_bounds(self, p: Position) -> None:
         if not (0 <= p.row < self._rows and 0 <= p.column < self._columns):
             raise ValueError(f"position out of bounds: ({p.row}, {p.column})")
+
+
+    def _check_new_queens(self, positions: tuple[Position, ...]) -> None:
+        # Checks that queens can be added in the given positions: each must be
+        # on the chessboard, distinct from the others, and not already
+        # occupied.  Long lists are first checked all at once -- the extremes
+        # of their rows and columns, and the size of a set of them -- which
+        # is done almost entirely in C.  Only if that finds a problem (or the
+        # list is short) are they checked one at a time, which raises the
+        # same exception for the same position as it always has.
+        if len(positions) >= _BULK_CHECK_THRESHOLD:
+            rows, columns = zip(*positions)
+            if 0 <= min(rows) and max(rows) < self._rows \
+                    and 0 <= min(columns) and max(columns) < self._columns \
+                    and len(set(positions)) == len(positions) \
+                    and not (self._queens and any(map(self._queens.__contains__, positions))):
+                return
+
+        seen = set()
+        for q in positions:
+            self._check_in_bounds(q)
+            if q in self._queens or q in seen:
+                raise DuplicateQueenError(q)
+            seen.add(q)
+
+
+    def _build(self, queens: tuple[Position, ...]) -> None:
+        # Stores the given (already validated) queens, leaving the line counts
+        # and the hash to be computed when they're first needed.  Only a few
+        # queens are interned; many of them are stored as they were given.
+        if len(queens) >= _BULK_CHECK_THRESHOLD:
+            self._queens = dict.fromkeys(queens)
+        else:
+            self._queens = dict.fromkeys(_intern_positions(queens))
+        self._line_counts = None
+        self._attacking_pairs = 0
+        self._zobrist = None
+
+
+    def _count_lines(self) -> None:
+        # Counts the queens on each line all at once, and then the pairs on
+        # each line from those counts.
+        line_counts = Counter(chain.from_iterable(map(_lines_through, self._queens)))
+        self._line_counts = line_counts
+        self._attacking_pairs = sum(count * (count - 1) // 2 for count in line_counts.values())
+
+
+    def _hash_key(self) -> int:
+        if self._zobrist is None:
+            self._zobrist = reduce(xor, map(_zobrist_key, self._queens), 0)
+        return self._zobrist
+
+
+    def _derive(self, added, removed) -> Self:
+        # Builds the state that results from removing and then adding the given
+        # (already validated) queens, starting from this state's bookkeeping
+        # rather than validating and counting every queen again.
+        derived = self._copy()
+        for q in removed:
+            derived._remove_queen(q)
+        for q in added:
+            derived._add_queen(q)
+        return derived
+
+
+    def _copy(self) -> Self:
+        # A state that's about to have others derived from it moves its queens
+        # and line counts into PersistentMaps, which its derived states can
+        # then modify while sharing them.  Nothing about it visibly changes.
+        if self._line_counts is None:
+            self._count_lines()
+        if type(self._queens) is dict:
+            self._queens = PersistentMap(self._queens)
+        if type(self._line_counts) is not PersistentMap:
+            self._line_counts = PersistentMap(self._line_counts)
+
+        copy = object.__new__(type(self))
+        copy._rows = self._rows
+        copy._columns = self._columns
+        copy._queens = self._queens
+        copy._line_counts = self._line_counts
+        copy._attacking_pairs = self._attacking_pairs
+        copy._zobrist = self._zobrist
+        return copy
+
+
+    def _add_queen(self, p: Position) -> None:
+        # Only ever called on a state that hasn't yet been handed to a caller.
+        self._queens = self._queens.set(p, None)
+        if self._zobrist is not None:
+            self._zobrist ^= _zobrist_key(p)
+        for line in _lines_through(p):
+            count = self._line_counts.get(line, 0)
+            self._attacking_pairs += count
+            self._line_counts = self._line_counts.set(line, count + 1)
+
+
+    def _remove_queen(self, p: Position) -> None:
+        # Only ever called on a state that hasn't yet been handed to a caller.
+        self._queens = self._queens.delete(p)
+        if self._zobrist is not None:
+            self._zobrist ^= _zobrist_key(p)
+        for line in _lines_through(p):
+            count = self._line_counts[line] - 1
+            self._attacking_pairs -= count
+            if count > 0:
+                self._line_counts = self._line_counts.set(line, count)
+            else:
+                self._line_counts = self._line_counts.delete(line)
+
+
+
+class BitboardQueensState(QueensState):
+    """Immutably represents the state of a chessboard in the same way as
+    QueensState, but additionally keeps, for each row with a queen in it, a
+    bitmask of the columns occupied in that row, so that has_queen is a
+    lookup of one row's bitmask and a test of one of its bits.  Like the line
+    counts, the bitmasks are kept in a PersistentMap once a state has others
+    derived from it, so derived states share them.
+
+    Each bitmask has one bit per column, so its memory grows with the width
+    of the chessboard times the number of rows with queens in them, and it's
+    best suited to boards small enough for that to be cheap."""
+
+    __slots__ = ('_row_masks',)
+
+    def has_queen(self, position: Position) -> bool:
+        """Returns True if a queen occupies the given position on the chessboard, or
+        False otherwise."""
+        if not 0 <= position.column < self._columns:
+            return False
+        return (self._row_masks.get(position.row, 0) >> position.column) & 1 == 1
+
+
+    def _build(self, queens: tuple[Position, ...]) -> None:
+        super()._build(queens)
+        row_masks = {}
+        for row, column in self._queens:
+            row_masks[row] = row_masks.get(row, 0) | (1 << column)
+        self._row_masks = row_masks
+
+
+    def _copy(self) -> Self:
+        copy = super()._copy()
+        if type(self._row_masks) is dict:
+            self._row_masks = PersistentMap(self._row_masks)
+        copy._row_masks = self._row_masks
+        return copy
+
+
+    def _add_queen(self, p: Position) -> None:
+        super()._add_queen(p)
+        self._row_masks = self._row_masks.set(p.row, self._row_masks.get(p.row, 0) | (1 << p.column))
+
+
+    def _remove_queen(self, p: Position) -> None:
+        super()._remove_queen(p)
+        mask = self._row_masks[p.row] & ~(1 << p.column)
+        if mask:
+            self._row_masks = self._row_masks.set(p.row, mask)
+        else:
+            self._row_masks = self._row_masks.delete(p.row)
+
+
+
+class CanonicalQueensSet:
+    """A set of chessboards in which boards that are rotations or reflections of
+    one another are considered the same.  Each distinct board is stored only
+    once, by its canonical form."""
+
+    def __init__(self, states: list[QueensState] | None = None) -> None:
+        """Initializes the set to contain the given chessboards (if any)."""
+        self._by_hash: dict[int, list[QueensState]] = {}
+        self._size = 0
+        for state in states if states is not None else ():
+            self.add(state)
+
+
+    def __len__(self) -> int:
+        return self._size
+
+
+    def __contains__(self, state: QueensState) -> bool:
+        return self._find(*state._canonical_key()) is not None
+
+
+    def __iter__(self) -> Iterator[QueensState]:
+        for states in self._by_hash.values():
+            yield from states
+
+
+    def add(self, state: QueensState) -> bool:
+        """Adds the canonical form of the given chessboard to the set, unless an
+        equivalent one is already present.  Returns True if it was added, or
+        False if it was already present."""
+        key, canonical = state._canonical_key()
+        if self._find(key, canonical) is not None:
+            return False
+        self._by_hash.setdefault(key, []).append(canonical)
+        self._size += 1
+        return True
+
+
+    def _find(self, key: int, canonical: QueensState) -> QueensState | None:
+        # Canonical forms with equal hashes are almost certainly equal, but
+        # they're compared to be sure.
+        for existing in self._by_hash.get(key, ()):
+            if existing == canonical:
+                return existing
+        return None
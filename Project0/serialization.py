@@ -0,0 +1,235 @@
+# serialization.py
+#
+# ICS 33 Fall 2025
+# Project 0: History of Modern
+#
+# A module containing tools that store large numbers of QueensStates in a
+# compact binary file and read them back, one at a time, without loading the
+# whole file into memory.
+#
+# Every QueensState in a file has the same numbers of rows and columns, and no
+# more than one queen in any row (which is the case for every solution, and
+# every partial solution, to the n-queens problem).  That lets each of them be
+# stored as one record listing the column of the queen in each row.  The file
+# is laid out as follows, with all integers in little-endian byte order:
+#
+# * A 24-byte header, containing the four bytes b'QNS1', a one-byte type code
+#   ('H' or 'I') that specifies whether each column is stored in two or four
+#   bytes, three bytes of padding, and then the numbers of rows and columns as
+#   eight-byte unsigned integers.
+#
+# * One record per QueensState, each of which contains the column of the
+#   queen in each row, from the first row to the last, or the largest value
+#   of the type code (0xFFFF or 0xFFFFFFFF) for a row containing no queen.
+#
+# Since the records all have the same size, reading a file memory-maps it and
+# finds each record by its index.
+
+from array import array
+from collections.abc import Iterator, Sequence
+import mmap
+from pathlib import Path
+import struct
+import sys
+from typing import BinaryIO
+
+from queens import QueensState, Position
+
+
+
+_MAGIC = b'QNS1'
+_HEADER = struct.Struct('<4sc3xQQ')
+_EMPTY = {'H': 0xFFFF, 'I': 0xFFFFFFFF}
+
+
+
+def _type_code_for(columns: int) -> str:
+    if columns < _EMPTY['H']:
+        return 'H'
+    elif columns < _EMPTY['I']:
+        return 'I'
+    else:
+        raise ValueError(f'too many columns to store: {columns}')
+
+
+
+class QueensStateWriter:
+    """Writes QueensStates with the same numbers of rows and columns to a binary
+    file, one at a time."""
+
+    def __init__(self, file: BinaryIO, rows: int, columns: int) -> None:
+        """Initializes the writer, given a file opened for writing in binary mode,
+        and writes the header describing the given numbers of rows and columns."""
+        self._file = file
+        self._rows = rows
+        self._columns = columns
+        self._type_code = _type_code_for(columns)
+        self._count = 0
+        file.write(_HEADER.pack(_MAGIC, self._type_code.encode('ascii'), rows, columns))
+
+
+    def count(self) -> int:
+        """Returns the number of records written so far."""
+        return self._count
+
+
+    def write(self, state: QueensState) -> None:
+        """Writes one QueensState as a record.  Raises a ValueError if its numbers
+        of rows and columns differ from the file's, or if it has more than one
+        queen in any row."""
+        if (state.rows(), state.columns()) != (self._rows, self._columns):
+            raise ValueError(f'expected a {self._rows} x {self._columns} board, '
+                             f'not {state.rows()} x {state.columns()}')
+
+        record = array(self._type_code, [_EMPTY[self._type_code]]) * self._rows
+        for q in state.queens():
+            if record[q.row] != _EMPTY[self._type_code]:
+                raise ValueError(f'more than one queen in row {q.row}')
+            record[q.row] = q.column
+        self._write_record(record)
+
+
+    def write_columns(self, columns: Sequence[int]) -> None:
+        """Writes one record directly from the column of the queen in each row (or
+        a negative number for a row without one), such as those produced by the
+        solvers, without building a QueensState first."""
+        if len(columns) != self._rows:
+            raise ValueError(f'expected {self._rows} columns, not {len(columns)}')
+
+        # The columns are checked before the record is built, since a column too
+        # large for the type code would make array raise an OverflowError.
+        for column in columns:
+            if column >= self._columns:
+                raise ValueError(f'column out of bounds: {column}')
+        empty = _EMPTY[self._type_code]
+        self._write_record(array(self._type_code, (empty if c < 0 else c for c in columns)))
+
+
+    def _write_record(self, record: array) -> None:
+        if sys.byteorder != 'little':
+            record.byteswap()
+        self._file.write(record.tobytes())
+        self._count += 1
+
+
+
+class QueensStateReader:
+    """Reads the records of a file written by a QueensStateWriter, by memory-mapping
+    it, so that only the records actually used are ever read into memory."""
+
+    def __init__(self, path: Path) -> None:
+        """Opens and memory-maps the file at the given path.  Raises a ValueError
+        if it isn't a file written by a QueensStateWriter."""
+        self._file = Path(path).open('rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access = mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f'not a queens file: {path}')
+
+        try:
+            if len(self._map) < _HEADER.size:
+                raise ValueError(f'not a queens file: {path}')
+            magic, type_code, self._rows, self._columns = _HEADER.unpack_from(self._map, 0)
+            self._type_code = type_code.decode('ascii', errors = 'replace')
+            if magic != _MAGIC or self._type_code not in _EMPTY:
+                raise ValueError(f'not a queens file: {path}')
+
+            self._record_size = self._rows * array(self._type_code).itemsize
+            body_size = len(self._map) - _HEADER.size
+            if self._record_size == 0 or body_size % self._record_size != 0:
+                raise ValueError(f'truncated queens file: {path}')
+            self._count = body_size // self._record_size
+        except ValueError:
+            self.close()
+            raise
+
+
+    def __enter__(self) -> 'QueensStateReader':
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+    def __len__(self) -> int:
+        return self._count
+
+
+    def __iter__(self) -> Iterator[QueensState]:
+        for index in range(self._count):
+            yield self.state(index)
+
+
+    def close(self) -> None:
+        """Unmaps and closes the file.  Memoryviews returned by record() must be
+        released beforehand; if any aren't, a BufferError is raised and the file
+        stays mapped until they are, though the file itself is still closed."""
+        try:
+            self._map.close()
+        finally:
+            self._file.close()
+
+
+    def rows(self) -> int:
+        """Returns the number of rows on every chessboard in the file."""
+        return self._rows
+
+
+    def columns(self) -> int:
+        """Returns the number of columns on every chessboard in the file."""
+        return self._columns
+
+
+    def record(self, index: int) -> Sequence[int]:
+        """Returns the record at the given index: the column of the queen in each
+        row, or empty_column() for a row without one.  Where possible, it's a
+        view into the memory-mapped file rather than a copy."""
+        if not 0 <= index < self._count:
+            raise IndexError(f'record index out of range: {index}')
+        start = _HEADER.size + index * self._record_size
+        view = memoryview(self._map)[start:start + self._record_size]
+        if sys.byteorder == 'little':
+            return view.cast(self._type_code)
+        else:
+            record = array(self._type_code, view.tobytes())
+            view.release()
+            record.byteswap()
+            return record
+
+
+    def empty_column(self) -> int:
+        """Returns the value that records use for a row without a queen."""
+        return _EMPTY[self._type_code]
+
+
+    def state(self, index: int) -> QueensState:
+        """Builds the QueensState stored in the record at the given index."""
+        record = self.record(index)
+        empty = self.empty_column()
+        try:
+            queens = tuple(Position(row, column) for row, column in enumerate(record) if column != empty)
+        finally:
+            if isinstance(record, memoryview):
+                record.release()
+        return QueensState(self._rows, self._columns, queens)
+
+
+
+def write_states(path: Path, states: Iterator[QueensState], rows: int, columns: int) -> int:
+    """Writes the given QueensStates, each of which has the given numbers of rows
+    and columns, to a new file at the given path, consuming them one at a time.
+    Returns the number written."""
+    with Path(path).open('wb') as file:
+        writer = QueensStateWriter(file, rows, columns)
+        for state in states:
+            writer.write(state)
+        return writer.count()
+
+
+def read_states(path: Path) -> Iterator[QueensState]:
+    """Generates the QueensStates stored in the file at the given path, building
+    each one only when it's needed."""
+    with QueensStateReader(path) as reader:
+        yield from reader
@@ -0,0 +1,528 @@
+# solver.py
+#
+# ICS 33 Fall 2025
+# Project 0: History of Modern
+#
+# A module containing tools that solve the n-queens problem (i.e., arrange n
+# queens on an n x n chessboard so that none of them can capture any other),
+# building on the QueensState class in "queens.py" to report its results.
+#
+# Two strategies are offered:
+#
+# * Backtracking, which places one queen per row, keeping track of which
+#   columns, diagonals and anti-diagonals are attacked as bitmasks, so that
+#   the safe columns in each row can be found with a few bitwise operations.
+#   This finds every solution, so it's the one to use for enumeration, though
+#   the number of solutions grows so quickly that it's only practical for
+#   smallish boards.
+#
+# * Min-conflicts, a local search that starts from a mostly-safe arrangement
+#   with one queen in every row and column, then repeatedly swaps the columns
+#   of an attacked queen and a randomly chosen one, keeping the swap whenever
+#   it doesn't increase the number of attacking pairs.  This finds one
+#   solution quickly even for boards with 10^5 or more rows, but it can't
+#   enumerate them, and it can't prove that no solution exists.
+#
+# When only the number of solutions is needed, count_solutions runs the same
+# backtracking search without building any QueensStates, and
+# count_solutions_parallel splits that search across a pool of processes.
+#
+# Long enumerations can instead use ResumableSolutions (or the generator
+# iter_solutions_resumable), which save the frontier of the search -- the
+# queens placed so far and the columns not yet tried in each row -- to a
+# checkpoint file, so that a search interrupted partway through can be
+# resumed from where it left off.
+
+from collections import namedtuple
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+from pathlib import Path
+import random
+import time
+
+from queens import QueensState, Position
+
+
+
+BACKTRACKING = 'backtracking'
+MIN_CONFLICTS = 'min_conflicts'
+
+_CHECKPOINT_FORMAT = 1
+
+
+
+SolutionCount = namedtuple('SolutionCount', ['total', 'workers'])
+
+SolutionCount.__doc__ = 'The result of counting the solutions to the n-queens problem in parallel.'
+SolutionCount.total.__doc__ = 'The number of solutions'
+SolutionCount.workers.__doc__ = 'A list of one WorkerThroughput per worker process that counted any subtrees'
+
+
+WorkerThroughput = namedtuple('WorkerThroughput', ['pid', 'subtrees', 'nodes', 'seconds', 'nodes_per_second'])
+
+WorkerThroughput.__doc__ = 'How much of a parallel solution count was done by one worker process.'
+WorkerThroughput.pid.__doc__ = 'The process ID of the worker'
+WorkerThroughput.subtrees.__doc__ = 'The number of subtrees of the search the worker counted'
+WorkerThroughput.nodes.__doc__ = 'The number of queens the worker placed while counting'
+WorkerThroughput.seconds.__doc__ = 'The total time the worker spent counting'
+WorkerThroughput.nodes_per_second.__doc__ = 'The rate at which the worker placed queens'
+
+
+
+def iter_solutions(n: int) -> Iterator[QueensState]:
+    """Generates every solution to the n-queens problem on an n x n chessboard,
+    each as a QueensState."""
+    _check_board_size(n)
+    for columns in _backtracking_placements(n):
+        yield _state_from_columns(columns)
+
+
+def solve(n: int, strategy: str = BACKTRACKING, *, seed: int | None = None,
+          max_steps: int | None = None) -> QueensState | None:
+    """Returns one solution to the n-queens problem on an n x n chessboard as
+    a QueensState, or None if the given strategy can't find one.
+
+    The strategy is either BACKTRACKING, which returns None only when there
+    is no solution, or MIN_CONFLICTS, which returns None when it hasn't found
+    a solution after max_steps attempted swaps.  The seed makes the latter's
+    random choices repeatable."""
+    _check_board_size(n)
+
+    if strategy == BACKTRACKING:
+        columns = next(_backtracking_placements(n), None)
+    elif strategy == MIN_CONFLICTS:
+        if max_steps is None:
+            max_steps = 50 * n + 10000
+        columns = _min_conflicts_placement(n, random.Random(seed), max_steps)
+    else:
+        raise ValueError(f'unknown strategy: {strategy}')
+
+    return _state_from_columns(columns) if columns is not None else None
+
+
+def count_solutions(n: int) -> int:
+    """Returns the number of solutions to the n-queens problem on an n x n
+    chessboard, counting them in this process."""
+    _check_board_size(n)
+    count, _ = _count_subtree(n, 0, 0, 0, 0)
+    return count
+
+
+def count_solutions_parallel(n: int, max_workers: int | None = None) -> SolutionCount:
+    """Counts the solutions to the n-queens problem on an n x n chessboard,
+    spreading the work across a pool of up to max_workers processes (by
+    default, one per CPU).
+
+    The search is split into subtrees by the placement of the queens in the
+    first two rows.  Since the mirror image of every solution is also a
+    solution, only placements whose first-row queen is in the left half of
+    the board are searched, and they're counted twice; when n is odd, the
+    first-row queen in the middle column is its own mirror image, so its
+    subtrees are limited to a second-row queen in the left half instead."""
+    _check_board_size(n)
+    subtrees = _split_into_subtrees(n)
+
+    total = 0
+    workers = {}
+    with ProcessPoolExecutor(max_workers = max_workers) as executor:
+        futures = [(weight, executor.submit(_count_subtree_in_worker, n, *subtree))
+                   for weight, subtree in subtrees]
+        for weight, future in futures:
+            count, nodes, seconds, pid = future.result()
+            total += weight * count
+            subtree_total, node_total, seconds_total = workers.get(pid, (0, 0, 0.0))
+            workers[pid] = (subtree_total + 1, node_total + nodes, seconds_total + seconds)
+
+    throughputs = []
+    for pid in sorted(workers):
+        subtree_total, node_total, seconds_total = workers[pid]
+        rate = node_total / seconds_total if seconds_total > 0 else 0.0
+        throughputs.append(WorkerThroughput(pid, subtree_total, node_total, seconds_total, rate))
+
+    return SolutionCount(total, throughputs)
+
+
+class ResumableSolutions:
+    """An iterator over the solutions to the n-queens problem on an n x n
+    chessboard, found by the same backtracking search as iter_solutions, whose
+    progress can be saved to a checkpoint file and later resumed from it, even
+    in another process."""
+
+    def __init__(self, n: int) -> None:
+        """Initializes the iterator to start at the beginning of the search."""
+        _check_board_size(n)
+        self._start(_Frontier(n), 0)
+
+
+    @staticmethod
+    def load(path: Path) -> 'ResumableSolutions':
+        """Builds an iterator that resumes the search from the checkpoint file at
+        the given path, generating only the solutions that come after the ones
+        generated before the checkpoint was saved.  Raises a ValueError if the
+        file isn't a valid checkpoint."""
+        try:
+            data = json.loads(Path(path).read_text(encoding = 'utf-8'))
+            frontier = _Frontier.from_json(data['frontier'])
+            found = data['found']
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            raise ValueError(f'invalid checkpoint: {path}') from e
+
+        if data.get('format') != _CHECKPOINT_FORMAT or not isinstance(found, int) or found < 0:
+            raise ValueError(f'invalid checkpoint: {path}')
+
+        solutions = object.__new__(ResumableSolutions)
+        solutions._start(frontier, found)
+        return solutions
+
+
+    def __iter__(self) -> 'ResumableSolutions':
+        return self
+
+
+    def __next__(self) -> QueensState:
+        state = _state_from_columns(next(self._placements))
+        self._found += 1
+        return state
+
+
+    def n(self) -> int:
+        """Returns the number of rows and columns on the chessboard."""
+        return self._frontier.n
+
+
+    def found(self) -> int:
+        """Returns the number of solutions generated so far, including those
+        generated before the checkpoint this iterator was resumed from."""
+        return self._found
+
+
+    def finished(self) -> bool:
+        """Returns True if the search has found every solution, or False otherwise."""
+        return self._frontier.row < 0
+
+
+    def save(self, path: Path) -> None:
+        """Saves the progress of the search to a checkpoint file at the given path.
+        The file is replaced in a single step, so that a process stopped while
+        saving leaves the previous checkpoint intact."""
+        path = Path(path)
+        data = {'format': _CHECKPOINT_FORMAT, 'found': self._found, 'frontier': self._frontier.to_json()}
+        temporary = path.with_name(path.name + '.tmp')
+        with temporary.open('w', encoding = 'utf-8') as file:
+            json.dump(data, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+
+
+    def _start(self, frontier: '_Frontier', found: int) -> None:
+        self._frontier = frontier
+        self._found = found
+        self._placements = _backtracking_placements(frontier.n, frontier)
+
+
+
+def iter_solutions_resumable(n: int, checkpoint: Path, interval: float = 60.0) -> Iterator[QueensState]:
+    """Generates every solution to the n-queens problem on an n x n chessboard,
+    like iter_solutions, saving its progress to the given checkpoint file at
+    least every interval seconds (checked whenever a solution is generated)
+    and once it's finished.  If the checkpoint file already exists, the search
+    resumes from it instead of starting over, so that a search that was
+    stopped partway through can be continued by calling this again with the
+    same arguments.  Raises a ValueError if the checkpoint is for a different
+    value of n.
+
+    A solution only counts as handled once the next one has been asked for,
+    so if the search is stopped while the caller is still handling one, that
+    solution is generated again when the search is resumed."""
+    checkpoint = Path(checkpoint)
+    if checkpoint.exists():
+        solutions = ResumableSolutions.load(checkpoint)
+        if solutions.n() != n:
+            raise ValueError(f'checkpoint is for n = {solutions.n()}, not n = {n}')
+    else:
+        solutions = ResumableSolutions(n)
+
+    last_saved = time.monotonic()
+    for state in solutions:
+        yield state
+        if time.monotonic() - last_saved >= interval:
+            solutions.save(checkpoint)
+            last_saved = time.monotonic()
+
+    solutions.save(checkpoint)
+
+
+def _split_into_subtrees(n: int) -> list[tuple[int, tuple[int, int, int, int]]]:
+    # Returns (weight, (row, columns, left, right)) for each subtree to
+    # be counted, where the weight is the number of solutions each of its
+    # solutions stands for, and the rest is the search state after placing
+    # queens in the first rows, in the form used by _count_subtree.
+    if n == 1:
+        return [(1, (0, 0, 0, 0))]
+
+    full = (1 << n) - 1
+    subtrees = []
+    for first in range(n // 2 + n % 2):
+        bit = 1 << first
+        middle = n % 2 == 1 and first == n // 2
+        columns, left, right = bit, (bit << 1) & full, bit >> 1
+        available = full & ~(columns | left | right)
+        while available:
+            second_bit = available & -available
+            available ^= second_bit
+            if middle and second_bit.bit_length() - 1 > n // 2:
+                continue
+            subtrees.append((
+                2 if not middle or second_bit.bit_length() - 1 < n // 2 else 1,
+                (2, columns | second_bit, ((left | second_bit) << 1) & full, (right | second_bit) >> 1)))
+    return subtrees
+
+
+def _count_subtree_in_worker(n: int, row: int, columns: int, left: int, right: int) -> tuple[int, int, float, int]:
+    start = time.perf_counter()
+    count, nodes = _count_subtree(n, row, columns, left, right)
+    return count, nodes, time.perf_counter() - start, os.getpid()
+
+
+def _count_subtree(n: int, row: int, columns: int, left: int, right: int) -> tuple[int, int]:
+    # Counts the solutions that extend a partial search state in which the
+    # queens in the rows above the given one attack the given columns, and
+    # (shifted as in _backtracking_placements) the given diagonals.  Returns
+    # that count, along with the number of queens placed along the way.
+    if row == n:
+        return 1, 0
+
+    full = (1 << n) - 1
+    count = 0
+    nodes = 0
+    stack = [(row, columns, left, right, full & ~(columns | left | right))]
+    while stack:
+        row, columns, left, right, available = stack.pop()
+        while available:
+            bit = available & -available
+            available ^= bit
+            nodes += 1
+            if row == n - 1:
+                count += 1
+            else:
+                next_columns = columns | bit
+                next_left = ((left | bit) << 1) & full
+                next_right = (right | bit) >> 1
+                stack.append((row + 1, next_columns, next_left, next_right,
+                              full & ~(next_columns | next_left | next_right)))
+    return count, nodes
+
+
+def _check_board_size(n: int) -> None:
+    if not isinstance(n, int) or n <= 0:
+        raise ValueError('n must be a positive integer')
+
+
+def _state_from_columns(columns: list[int]) -> QueensState:
+    # The solvers only ever produce one queen per row, in a column on the
+    # board, so there's nothing for the constructor to validate.
+    return QueensState._trusted(len(columns), len(columns), tuple(map(Position, range(len(columns)), columns)))
+
+
+class _Frontier:
+    # The point a backtracking search has reached, which is all it needs in
+    # order to carry on from there: the row it's working on, the columns of
+    # the queens placed in the rows above it, and, as a bitmask for each row
+    # down to and including that one, the safe columns not yet tried.  A row
+    # of -1 means the search is finished.
+
+    def __init__(self, n: int, row: int = 0, columns: list[int] | None = None,
+                 available: list[int] | None = None) -> None:
+        self.n = n
+        self.row = row
+        self.columns = (columns or []) + [0] * (n - len(columns or []))
+        if available is None:
+            available = [(1 << n) - 1]
+        self.available = available + [0] * (n - len(available))
+
+
+    def to_json(self) -> dict:
+        return {
+            'n': self.n,
+            'row': self.row,
+            'columns': self.columns[:max(self.row, 0)],
+            'available': self.available[:self.row + 1],
+        }
+
+
+    @staticmethod
+    def from_json(data: dict) -> '_Frontier':
+        n, row, columns, available = data['n'], data['row'], data['columns'], data['available']
+        if not isinstance(n, int) or not isinstance(row, int) or n <= 0 or not -1 <= row < n \
+                or len(columns) != max(row, 0) or len(available) != row + 1 \
+                or not all(isinstance(c, int) and 0 <= c < n for c in columns) \
+                or not all(isinstance(a, int) and 0 <= a < (1 << n) for a in available):
+            raise ValueError('inconsistent search frontier')
+        return _Frontier(n, row, columns, available)
+
+
+
+def _backtracking_placements(n: int, frontier: _Frontier | None = None) -> Iterator[list[int]]:
+    # Generates the column of the queen in each row for every solution,
+    # starting from the given frontier (or from scratch), which is kept up to
+    # date whenever a solution is generated.  The search is iterative, with
+    # one entry per row in each of these lists:
+    #
+    # * available: the safe columns in that row not yet tried, as a bitmask
+    # * attacked_columns: the columns occupied by the queens in the rows above
+    # * attacked_left / attacked_right: the columns in that row attacked along
+    #   a diagonal by the queens in the rows above, which shift one column
+    #   left or right per row as they move down the board
+    if frontier is None:
+        frontier = _Frontier(n)
+
+    full = (1 << n) - 1
+    available = frontier.available
+    columns = frontier.columns
+    attacked_columns = [0] * n
+    attacked_left = [0] * n
+    attacked_right = [0] * n
+
+    row = frontier.row
+    for above in range(row):
+        bit = 1 << columns[above]
+        attacked_columns[above + 1] = attacked_columns[above] | bit
+        attacked_left[above + 1] = ((attacked_left[above] | bit) << 1) & full
+        attacked_right[above + 1] = (attacked_right[above] | bit) >> 1
+
+    while row >= 0:
+        a = available[row]
+        if a == 0:
+            row -= 1
+            continue
+
+        bit = a & -a
+        available[row] = a ^ bit
+        columns[row] = bit.bit_length() - 1
+
+        if row == n - 1:
+            frontier.row = row
+            yield columns.copy()
+            continue
+
+        c = attacked_columns[row] | bit
+        left = ((attacked_left[row] | bit) << 1) & full
+        right = (attacked_right[row] | bit) >> 1
+        row += 1
+        attacked_columns[row] = c
+        attacked_left[row] = left
+        attacked_right[row] = right
+        available[row] = full & ~(c | left | right)
+
+    frontier.row = -1
+
+
+def _min_conflicts_placement(n: int, rng: random.Random, max_steps: int) -> list[int] | None:
+    # The search can get stuck among arrangements that no single swap improves
+    # (small boards are especially prone to this), so it starts over from a
+    # new random arrangement whenever an attempt stops making progress, until
+    # max_steps is spent.
+    patience = n + 50
+    while max_steps > 0:
+        columns, steps = _min_conflicts_attempt(n, rng, max_steps, patience)
+        if columns is not None:
+            return columns
+        max_steps -= steps
+    return None
+
+
+def _min_conflicts_attempt(n: int, rng: random.Random, max_steps: int,
+                           patience: int) -> tuple[list[int] | None, int]:
+    # Returns the solution found (or None if it gave up), along with the number
+    # of swaps it attempted.  It gives up after max_steps attempts, or after
+    # the given number of attempts in a row fail to reduce the fewest attacking
+    # pairs seen so far.
+    # Keeps the queens as a permutation -- the queen in each row is in
+    # columns[row] -- so that no two queens ever share a row or column, and
+    # only diagonals and anti-diagonals need counting.  Swapping the columns
+    # of two rows' queens keeps it a permutation.
+    columns = list(range(n))
+    diagonals = [0] * (2 * n - 1)
+    anti_diagonals = [0] * (2 * n - 1)
+    attacking_pairs = 0
+
+    def place(row: int, column: int) -> None:
+        nonlocal attacking_pairs
+        attacking_pairs += diagonals[row - column + n - 1] + anti_diagonals[row + column]
+        diagonals[row - column + n - 1] += 1
+        anti_diagonals[row + column] += 1
+
+    def lift(row: int, column: int) -> None:
+        nonlocal attacking_pairs
+        diagonals[row - column + n - 1] -= 1
+        anti_diagonals[row + column] -= 1
+        attacking_pairs -= diagonals[row - column + n - 1] + anti_diagonals[row + column]
+
+    def attackers(row: int) -> int:
+        column = columns[row]
+        return diagonals[row - column + n - 1] + anti_diagonals[row + column] - 2
+
+    # Place the queens one row at a time, swapping in a random column from
+    # among those not yet used whenever that column is safe.  Most rows find
+    # a safe column quickly; once the budget of tries is spent, the remaining
+    # rows simply take whatever column they've got, and it's left to the
+    # repair phase to sort them out.
+    tries_left = 3 * n + 10
+    for row in range(n):
+        while tries_left > 0:
+            tries_left -= 1
+            other = rng.randrange(row, n)
+            column = columns[other]
+            if diagonals[row - column + n - 1] == 0 and anti_diagonals[row + column] == 0:
+                columns[row], columns[other] = column, columns[row]
+                break
+        place(row, columns[row])
+
+    # Repair the attacked queens by swapping each with a randomly chosen
+    # queen whenever that doesn't increase the number of attacking pairs.
+    # Every attacking pair has at least one of its queens among the suspects.
+    suspects = [row for row in range(n) if attackers(row) > 0]
+    steps = 0
+    fewest_pairs = attacking_pairs
+    last_progress = 0
+    while attacking_pairs > 0:
+        if not suspects:
+            suspects = [row for row in range(n) if attackers(row) > 0]
+
+        next_suspects = []
+        for row in suspects:
+            if attackers(row) == 0:
+                continue
+            if steps >= max_steps or steps - last_progress >= patience:
+                return None, steps
+            steps += 1
+
+            next_suspects.append(row)
+            other = rng.randrange(n)
+            if other == row:
+                continue
+
+            column, other_column = columns[row], columns[other]
+            before = attacking_pairs
+            lift(row, column)
+            lift(other, other_column)
+            place(row, other_column)
+            place(other, column)
+            if attacking_pairs <= before:
+                columns[row], columns[other] = other_column, column
+                next_suspects.append(other)
+                if attacking_pairs < fewest_pairs:
+                    fewest_pairs = attacking_pairs
+                    last_progress = steps
+            else:
+                lift(other, column)
+                lift(row, other_column)
+                place(row, column)
+                place(other, other_column)
+
+        suspects = next_suspects
+
+    return columns, steps
@@ -0,0 +1,78 @@
+# test_batch.py
+#
+# ICS 33 Fall 2025
+# Project 0: History of Modern
+#
+# Unit tests for checking the safety of many chessboards at once with "batch.py".
+
+import batch
+from queens import QueensState, Position
+import random
+import solver
+import unittest
+
+
+
+class TestEvaluateSafety(unittest.TestCase):
+    def test_states_match_any_queens_unsafe(self):
+        rng = random.Random(8)
+        states = []
+        for _ in range(50):
+            queens = {Position(rng.randrange(6), rng.randrange(6)) for _ in range(rng.randrange(7))}
+            states.append(QueensState(6, 6, tuple(queens)))
+        result = batch.evaluate_safety(states)
+        self.assertEqual(list(result.unsafe), [state.any_queens_unsafe() for state in states])
+
+    def test_states_count_pairs_including_shared_rows(self):
+        state = QueensState(4, 4, (Position(0, 0), Position(0, 3), Position(3, 3)))
+        self.assertEqual(list(batch.evaluate_safety([state]).conflicts), [3])
+
+    def test_columns_count_pairs(self):
+        boards = [
+            [1, 3, 0, 2],
+            [0, 1, 2, 3],
+            [0, 0, -1, -1],
+            [-1, -1, -1, -1],
+            [3, -1, -1, 0],
+        ]
+        result = batch.evaluate_safety(boards)
+        self.assertEqual(list(result.conflicts), [0, 6, 1, 0, 1])
+        self.assertEqual(list(result.unsafe), [False, True, True, False, True])
+
+    def test_columns_of_different_lengths(self):
+        result = batch.evaluate_safety([[0], [0, 1], [1, 3, 0, 2]])
+        self.assertEqual(list(result.conflicts), [0, 1, 0])
+
+    def test_solutions_are_all_safe(self):
+        boards = []
+        for state in solver.iter_solutions(7):
+            columns = [0] * 7
+            for q in state.queens():
+                columns[q.row] = q.column
+            boards.append(columns)
+        result = batch.evaluate_safety(boards)
+        self.assertFalse(any(result.unsafe))
+
+    def test_empty_batch(self):
+        result = batch.evaluate_safety([])
+        self.assertEqual((list(result.unsafe), list(result.conflicts)), ([], []))
+
+    @unittest.skipIf(batch.numpy is None, 'NumPy is not installed')
+    def test_numpy_array_matches_columns(self):
+        rng = random.Random(33)
+        boards = [[rng.randrange(-1, 8) for _ in range(8)] for _ in range(200)]
+        expected = [batch._attacking_pairs(batch._placed(board)) for board in boards]
+        result = batch.evaluate_safety(batch.numpy.array(boards))
+        self.assertIsInstance(result.conflicts, batch.numpy.ndarray)
+        self.assertEqual(result.conflicts.tolist(), expected)
+        self.assertEqual(result.unsafe.tolist(), [count > 0 for count in expected])
+
+    @unittest.skipIf(batch.numpy is None, 'NumPy is not installed')
+    def test_numpy_array_must_be_two_dimensional(self):
+        with self.assertRaises(ValueError):
+            batch.evaluate_safety(batch.numpy.array([1, 2, 3]))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+# test_persistent_map.py
+#
+# ICS 33 Fall 2025
+# Project 0: History of Modern
+#
+# Unit tests for the PersistentMap class in "persistent_map.py".
+
+from persistent_map import PersistentMap
+import copy
+import pickle
+import random
+import unittest
+
+
+
+class CollidingKey:
+    def __init__(self, name):
+        self.name = name
+
+    def __hash__(self):
+        return 42
+
+    def __eq__(self, other):
+        return isinstance(other, CollidingKey) and self.name == other.name
+
+
+
+class TestPersistentMap(unittest.TestCase):
+    def test_empty_map_has_no_keys(self):
+        m = PersistentMap()
+        self.assertEqual(len(m), 0)
+        self.assertNotIn('a', m)
+        self.assertEqual(list(m), [])
+
+    def test_init_from_mapping(self):
+        m = PersistentMap({'a': 1, 'b': 2})
+        self.assertEqual(len(m), 2)
+        self.assertEqual(m['a'], 1)
+        self.assertEqual(m.get('b'), 2)
+        self.assertEqual(m.get('c', 3), 3)
+
+    def test_set_does_not_modify_original(self):
+        m = PersistentMap({'a': 1})
+        n = m.set('b', 2).set('a', 10)
+        self.assertEqual(dict(m.items()), {'a': 1})
+        self.assertEqual(dict(n.items()), {'a': 10, 'b': 2})
+        self.assertEqual(len(n), 2)
+
+    def test_delete_does_not_modify_original(self):
+        m = PersistentMap({'a': 1, 'b': 2})
+        n = m.delete('a')
+        self.assertIn('a', m)
+        self.assertNotIn('a', n)
+        self.assertEqual(len(n), 1)
+
+    def test_delete_missing_key_raises(self):
+        with self.assertRaises(KeyError):
+            PersistentMap({'a': 1}).delete('b')
+
+    def test_getitem_missing_key_raises(self):
+        with self.assertRaises(KeyError):
+            PersistentMap()['a']
+
+    def test_setting_same_value_returns_same_map(self):
+        value = object()
+        m = PersistentMap().set('a', value)
+        self.assertIs(m.set('a', value), m)
+
+    def test_keys_with_colliding_hashes_are_kept_apart(self):
+        a, b, c = CollidingKey('a'), CollidingKey('b'), CollidingKey('c')
+        m = PersistentMap().set(a, 1).set(b, 2).set(c, 3)
+        self.assertEqual([m[a], m[b], m[c]], [1, 2, 3])
+        n = m.delete(b)
+        self.assertNotIn(b, n)
+        self.assertEqual(n[a], 1)
+        self.assertEqual(n.delete(a).delete(c).get(a), None)
+        self.assertEqual(len(PersistentMap({a: 1, b: 2})), 2)
+
+    def test_matches_dict_under_random_operations(self):
+        rng = random.Random(33)
+        expected = {}
+        m = PersistentMap()
+        history = []
+        for _ in range(3000):
+            key = rng.randrange(500)
+            if key in expected and rng.random() < 0.5:
+                del expected[key]
+                m = m.delete(key)
+            else:
+                expected[key] = rng.random()
+                m = m.set(key, expected[key])
+            history.append((m, dict(expected)))
+
+        for old_map, old_dict in history[::100]:
+            self.assertEqual(len(old_map), len(old_dict))
+            self.assertEqual(dict(old_map.items()), old_dict)
+
+    def test_bulk_built_map_matches_incrementally_built_map(self):
+        items = {(row, column): row * column for row in range(40) for column in range(40)}
+        bulk = PersistentMap(items)
+        incremental = PersistentMap()
+        for key, value in items.items():
+            incremental = incremental.set(key, value)
+        self.assertEqual(dict(bulk.items()), dict(incremental.items()))
+        for key in list(items)[::7]:
+            bulk = bulk.delete(key)
+            self.assertNotIn(key, bulk)
+
+    def test_pickled_and_copied_maps_keep_their_contents(self):
+        items = {(row, column): row * column for row in range(40) for column in range(40)}
+        items['label'] = 'x'
+        m = PersistentMap(items).set(CollidingKey(1), 'a').set(CollidingKey(2), 'b')
+        for restored in (pickle.loads(pickle.dumps(m)), copy.deepcopy(m)):
+            self.assertEqual(len(restored), len(m))
+            self.assertEqual(dict(restored.items()), dict(m.items()))
+            self.assertEqual(restored[(3, 4)], 12)
+            self.assertEqual(restored.delete((3, 4)).get((3, 4)), None)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,7 +11,10 @@
 # like "test_queen_count", since it doesn't entirely test the "queen_count" method,
 # but instead focuses on just one aspect of how it behaves.  You'll want to do likewise.
 
-from queens import QueensState, Position, DuplicateQueenError, MissingQueenError
+from queens import QueensState, BitboardQueensState, CanonicalQueensSet, Position, DuplicateQueenError, MissingQueenError
+from queens import intern_position
+import copy
+import pickle
 import unittest
 
 
@@ -95,6 +98,396 @@ class TestQueensState(unittest.TestCase):
         self.assertTrue(t.has_queen(Position(1, 1)))
         self.assertFalse(t.has_queen(Position(0, 0)))
         self.assertFalse(t.has_queen(Position(2, 2)))
+    def test_any_queens_unsafe_detects_shared_lines(self):
+        s = QueensState(8, 8)
+        self.assertFalse(s.any_queens_unsafe())
+        self.assertFalse(s.with_queens_added([Position(0, 0), Position(1, 2)]).any_queens_unsafe())
+        self.assertTrue(s.with_queens_added([Position(0, 0), Position(0, 5)]).any_queens_unsafe())
+        self.assertTrue(s.with_queens_added([Position(0, 3), Position(6, 3)]).any_queens_unsafe())
+        self.assertTrue(s.with_queens_added([Position(1, 1), Position(4, 4)]).any_queens_unsafe())
+        self.assertTrue(s.with_queens_added([Position(0, 4), Position(4, 0)]).any_queens_unsafe())
+
+    def test_any_queens_unsafe_updates_as_queens_added_one_at_a_time(self):
+        s = QueensState(4, 4)
+        for pos in [Position(0, 1), Position(1, 3), Position(2, 0), Position(3, 2)]:
+            s = s.with_queens_added([pos])
+            self.assertFalse(s.any_queens_unsafe())
+        self.assertTrue(s.with_queens_added([Position(0, 0)]).any_queens_unsafe())
+
+    def test_removing_attacker_makes_queens_safe_again(self):
+        s = QueensState(4, 4).with_queens_added([Position(0, 0), Position(2, 1), Position(3, 3)])
+        self.assertTrue(s.any_queens_unsafe())
+        self.assertFalse(s.with_queens_removed([Position(3, 3)]).any_queens_unsafe())
+        self.assertTrue(s.with_queens_removed([Position(2, 1)]).any_queens_unsafe())
+
+    def test_derived_state_does_not_share_counts_with_parent(self):
+        s = QueensState(4, 4).with_queens_added([Position(0, 0)])
+        t = s.with_queens_added([Position(1, 1)])
+        u = s.with_queens_added([Position(1, 2)])
+        self.assertFalse(s.any_queens_unsafe())
+        self.assertTrue(t.any_queens_unsafe())
+        self.assertFalse(u.any_queens_unsafe())
+
+    def test_with_queens_added_duplicate_within_positions_raises(self):
+        with self.assertRaises(DuplicateQueenError):
+            QueensState(4, 4).with_queens_added([Position(1, 1), Position(1, 1)])
+
+    def test_with_queens_removed_same_position_twice_raises(self):
+        s = QueensState(4, 4).with_queens_added([Position(1, 1)])
+        with self.assertRaises(MissingQueenError):
+            s.with_queens_removed([Position(1, 1), Position(1, 1)])
+
+    def test_conflicts_for_counts_attackers_along_every_line(self):
+        s = QueensState(5, 5, (Position(0, 0), Position(0, 4), Position(4, 2), Position(2, 3)))
+        self.assertEqual(s.conflicts_for(Position(2, 2)), 4)
+        self.assertEqual(s.conflicts_for(Position(1, 1)), 1)
+        self.assertEqual(QueensState(5, 5, (Position(0, 0),)).conflicts_for(Position(1, 2)), 0)
+
+    def test_conflicts_for_occupied_position_ignores_its_own_queen(self):
+        s = QueensState(4, 4, (Position(0, 0), Position(3, 3), Position(1, 2)))
+        self.assertEqual(s.conflicts_for(Position(0, 0)), 1)
+        self.assertEqual(s.conflicts_for(Position(1, 2)), 0)
+
+    def test_conflicts_for_out_of_bounds_raises(self):
+        with self.assertRaises(ValueError):
+            QueensState(4, 4).conflicts_for(Position(4, 0))
+
+    def test_unsafe_queens_lists_only_attacked_queens(self):
+        s = QueensState(4, 4, (Position(0, 0), Position(3, 3), Position(1, 2)))
+        self.assertEqual(sorted(s.unsafe_queens()), [Position(0, 0), Position(3, 3)])
+        self.assertEqual(s.with_queens_removed([Position(3, 3)]).unsafe_queens(), [])
+
+    def test_total_conflicts_counts_attacking_pairs(self):
+        s = QueensState(4, 4)
+        self.assertEqual(s.total_conflicts(), 0)
+        t = s.with_queens_added([Position(0, 0), Position(0, 3), Position(3, 3), Position(3, 0)])
+        self.assertEqual(t.total_conflicts(), 6)
+        self.assertEqual(t.with_queens_removed([Position(0, 0)]).total_conflicts(), 3)
+
+    def test_huge_board_with_few_queens(self):
+        n = 10 ** 6
+        queens = tuple(Position(row * 997, (row * 7919) % n) for row in range(1000))
+        s = QueensState(n, n, queens)
+        self.assertEqual(s.queen_count(), 1000)
+        self.assertTrue(s.has_queen(Position(997, 7919)))
+        self.assertFalse(s.has_queen(Position(n - 1, n - 1)))
+
+        t = s.with_queens_added([Position(n - 1, n - 1)]).with_queens_removed([Position(0, 0)])
+        self.assertTrue(t.has_queen(Position(n - 1, n - 1)))
+        self.assertFalse(t.has_queen(Position(0, 0)))
+        self.assertEqual(t.conflicts_for(Position(n - 1, 0)), 1)
+        self.assertEqual(t.total_conflicts(), s.total_conflicts() - s.conflicts_for(Position(0, 0))
+                         + t.conflicts_for(Position(n - 1, n - 1)))
+
+    def test_huge_board_line_counts_grow_with_queens_not_board(self):
+        n = 10 ** 6
+        s = QueensState(n, n, (Position(0, 0), Position(n - 1, n - 1), Position(5, n - 1)))
+        self.assertEqual(s.total_conflicts(), 2)
+        self.assertLessEqual(len(s._line_counts), 4 * s.queen_count())
+
+    def test_pickled_and_copied_states_keep_their_queens(self):
+        queens = tuple(Position(row, (row * 7) % 64) for row in range(64))
+        for s in (QueensState(64, 64, queens), QueensState(64, 64, queens[1:]).with_queens_added([queens[0]])):
+            for t in (pickle.loads(pickle.dumps(s)), copy.deepcopy(s)):
+                self.assertEqual(t, s)
+                self.assertEqual(hash(t), hash(s))
+                self.assertEqual(sorted(t.queens()), sorted(queens))
+                self.assertTrue(all(t.has_queen(q) for q in queens))
+                self.assertEqual(t.conflicts_for(Position(0, 1)), s.conflicts_for(Position(0, 1)))
+                self.assertEqual(t.total_conflicts(), s.total_conflicts())
+                self.assertEqual(t.with_queens_removed([queens[5]]).queen_count(), 63)
+
+    def test_states_share_interned_positions(self):
+        s = QueensState(4, 4, (Position(1, 2),))
+        t = QueensState(4, 4).with_queens_added([Position(1, 2)])
+        self.assertIs(s.queens()[0], t.queens()[0])
+
+    def test_states_have_no_instance_dict(self):
+        self.assertFalse(hasattr(QueensState(4, 4), '__dict__'))
+        self.assertFalse(hasattr(BitboardQueensState(4, 4), '__dict__'))
+
+    def test_states_with_same_queens_are_equal(self):
+        s = QueensState(4, 4, (Position(0, 1), Position(2, 3)))
+        t = QueensState(4, 4).with_queens_added([Position(2, 3)]).with_queens_added([Position(0, 1)])
+        self.assertEqual(s, t)
+        self.assertEqual(hash(s), hash(t))
+
+    def test_states_with_different_queens_or_sizes_are_not_equal(self):
+        s = QueensState(4, 4, (Position(0, 1),))
+        self.assertNotEqual(s, QueensState(4, 4, (Position(1, 0),)))
+        self.assertNotEqual(s, QueensState(4, 5, (Position(0, 1),)))
+        self.assertNotEqual(s, QueensState(4, 4))
+        self.assertNotEqual(s, 'not a state')
+
+    def test_hash_of_derived_state_matches_fresh_state(self):
+        s = QueensState(8, 8, (Position(0, 0), Position(3, 5), Position(7, 2)))
+        t = s.with_queens_removed([Position(3, 5)]).with_queens_added([Position(4, 4)])
+        u = QueensState(8, 8, (Position(7, 2), Position(4, 4), Position(0, 0)))
+        self.assertEqual(t, u)
+        self.assertEqual(hash(t), hash(u))
+        self.assertEqual(hash(t.with_queens_removed([Position(4, 4)]).with_queens_added([Position(3, 5)])), hash(s))
+
+    def test_states_work_as_dictionary_keys(self):
+        table = {QueensState(4, 4, (Position(1, 1),)): 'seen'}
+        self.assertEqual(table.get(QueensState(4, 4).with_queens_added([Position(1, 1)])), 'seen')
+        self.assertIsNone(table.get(QueensState(4, 4).with_queens_added([Position(1, 2)])))
+
+    def test_repr_lists_queens_in_order(self):
+        s = QueensState(4, 4, (Position(2, 0), Position(0, 3)))
+        self.assertEqual(repr(s), 'QueensState(4, 4, (Position(row=0, column=3), Position(row=2, column=0)))')
+
+    def test_long_queen_list_reports_first_invalid_position(self):
+        queens = [Position(row, row) for row in range(100)]
+        with self.assertRaises(ValueError) as context:
+            QueensState(100, 100, queens[:50] + [Position(50, 100), Position(-1, 0)] + queens[51:])
+        self.assertEqual(str(context.exception), 'position out of bounds: (50, 100)')
+        with self.assertRaises(DuplicateQueenError) as context:
+            QueensState(100, 100, queens + [Position(60, 60), Position(10, 10)])
+        self.assertEqual(str(context.exception), 'duplicate queen in row 60 column 60')
+
+    def test_adding_long_queen_list_reports_first_invalid_position(self):
+        s = QueensState(100, 100, (Position(70, 3),))
+        queens = [Position(row, 3) for row in range(100) if row != 70]
+        with self.assertRaises(DuplicateQueenError) as context:
+            s.with_queens_added(queens[:40] + [Position(70, 3)] + queens[40:])
+        self.assertEqual(str(context.exception), 'duplicate queen in row 70 column 3')
+        with self.assertRaises(ValueError):
+            s.with_queens_added(queens + [Position(100, 3)])
+
+    def test_adding_long_queen_list_matches_fresh_state(self):
+        queens = [Position(row, (row * 37) % 200) for row in range(200)]
+        s = QueensState(200, 200, queens[:10]).with_queens_added(queens[10:])
+        t = QueensState(200, 200, queens)
+        self.assertEqual(s, t)
+        self.assertEqual(hash(s), hash(t))
+        self.assertEqual(s.total_conflicts(), t.total_conflicts())
+        self.assertEqual(s.conflicts_for(Position(5, 5)), t.conflicts_for(Position(5, 5)))
+
+    def test_trusted_construction_matches_validated_construction(self):
+        queens = (Position(0, 1), Position(1, 3), Position(2, 0), Position(3, 0))
+        s = QueensState._trusted(4, 4, queens)
+        self.assertEqual(s, QueensState(4, 4, queens))
+        self.assertEqual(s.total_conflicts(), 1)
+        self.assertIs(s.queens()[0], intern_position(s.queens()[0]))
+
+
+
+class TestInternPosition(unittest.TestCase):
+    def test_equal_positions_intern_to_same_object(self):
+        self.assertIs(intern_position(Position(3, 5)), intern_position(Position(3, 5)))
+
+    def test_interned_position_is_equal_position(self):
+        p = intern_position((6, 7))
+        self.assertIsInstance(p, Position)
+        self.assertEqual(p, Position(6, 7))
+
+    def test_first_position_interned_is_kept(self):
+        p = Position(200, 201)
+        self.assertIs(intern_position(p), p)
+        self.assertIs(intern_position(Position(200, 201)), p)
+
+    def test_positions_far_from_the_corner_are_not_kept(self):
+        p = Position(3, 100000)
+        self.assertIs(intern_position(p), p)
+        self.assertIsNot(intern_position(Position(3, 100000)), p)
+
+    def test_queens_given_many_at_a_time_are_not_interned(self):
+        queens = tuple(Position(row, row) for row in range(40))
+        s = QueensState(40, 40, queens)
+        self.assertTrue(all(q is p for q, p in zip(s.queens(), queens)))
+
+
+
+class TestBitboardQueensState(unittest.TestCase):
+    def test_derived_states_keep_bitboard_representation(self):
+        s = BitboardQueensState(4, 4)
+        t = s.with_queens_added([Position(0, 1)])
+        u = t.with_queens_removed([Position(0, 1)])
+        self.assertIsInstance(t, BitboardQueensState)
+        self.assertIsInstance(u, BitboardQueensState)
+
+    def test_has_queen_matches_queens(self):
+        s = BitboardQueensState(5, 3).with_queens_added([Position(4, 2), Position(0, 0)])
+        for row in range(5):
+            for column in range(3):
+                p = Position(row, column)
+                self.assertEqual(s.has_queen(p), p in s.queens())
+
+    def test_has_queen_false_out_of_bounds(self):
+        s = BitboardQueensState(4, 4).with_queens_added([Position(0, 0)])
+        self.assertFalse(s.has_queen(Position(-1, 0)))
+        self.assertFalse(s.has_queen(Position(0, 4)))
+
+    def test_removed_queen_no_longer_present(self):
+        s = BitboardQueensState(4, 4).with_queens_added([Position(1, 1), Position(2, 3)])
+        t = s.with_queens_removed([Position(1, 1)])
+        self.assertFalse(t.has_queen(Position(1, 1)))
+        self.assertTrue(t.has_queen(Position(2, 3)))
+
+    def test_removing_one_of_two_queens_in_a_row_keeps_the_other(self):
+        s = BitboardQueensState(3, 70, (Position(1, 2), Position(1, 69), Position(2, 0)))
+        t = s.with_queens_removed([Position(1, 69)])
+        self.assertTrue(t.has_queen(Position(1, 2)))
+        self.assertFalse(t.has_queen(Position(1, 69)))
+        u = t.with_queens_removed([Position(1, 2)]).with_queens_added([Position(1, 68)])
+        self.assertEqual([p for p in (Position(1, 2), Position(1, 68), Position(2, 0)) if u.has_queen(p)],
+                         [Position(1, 68), Position(2, 0)])
+        self.assertTrue(s.has_queen(Position(1, 69)))
+
+    def test_any_queens_unsafe_matches_queens_state(self):
+        boards = [
+            [],
+            [Position(0, 1), Position(1, 3), Position(2, 0), Position(3, 2)],
+            [Position(0, 0), Position(0, 3)],
+            [Position(0, 2), Position(3, 2)],
+            [Position(0, 0), Position(3, 3)],
+            [Position(0, 3), Position(3, 0)],
+        ]
+        for queens in boards:
+            expected = QueensState(4, 4, tuple(queens)).any_queens_unsafe()
+            self.assertEqual(BitboardQueensState(4, 4, tuple(queens)).any_queens_unsafe(), expected)
+
+    def test_any_queens_unsafe_after_removing_one_of_two_queens_sharing_a_row(self):
+        s = BitboardQueensState(4, 4).with_queens_added([Position(0, 0), Position(0, 2), Position(2, 1)])
+        self.assertTrue(s.any_queens_unsafe())
+        self.assertFalse(s.with_queens_removed([Position(0, 2)]).any_queens_unsafe())
+        self.assertTrue(s.with_queens_removed([Position(2, 1)]).any_queens_unsafe())
+
+    def test_equal_to_queens_state_with_same_queens(self):
+        s = BitboardQueensState(4, 4, (Position(0, 1),))
+        t = QueensState(4, 4, (Position(0, 1),))
+        self.assertEqual(s, t)
+        self.assertEqual(hash(s), hash(t))
+
+    def test_init_with_queens_duplicate_or_oob(self):
+        q = Position(1, 1)
+        with self.assertRaises(DuplicateQueenError):
+            BitboardQueensState(4, 4, queens = (q, q))
+        with self.assertRaises(ValueError):
+            BitboardQueensState(4, 4, queens = (Position(0, 4),))
+
+    def test_adding_long_queen_list_keeps_bitboards(self):
+        queens = [Position(row, (row * 3) % 40) for row in range(40)]
+        s = BitboardQueensState(40, 40).with_queens_added(queens)
+        self.assertIsInstance(s, BitboardQueensState)
+        self.assertTrue(all(s.has_queen(q) for q in queens))
+        self.assertFalse(s.has_queen(Position(0, 1)))
+        self.assertEqual(s.any_queens_unsafe(), QueensState(40, 40, queens).any_queens_unsafe())
+
+
+class TestCompletion(unittest.TestCase):
+    def test_empty_board_completions_are_all_solutions(self):
+        completions = list(QueensState(8, 8).iter_completions())
+        self.assertEqual(len(completions), 92)
+        self.assertEqual(len(set(completions)), 92)
+
+    def test_completions_keep_existing_queens(self):
+        s = QueensState(8, 8, (Position(0, 0),))
+        completions = list(s.iter_completions())
+        self.assertEqual(len(completions), 4)
+        for completion in completions:
+            self.assertTrue(completion.has_queen(Position(0, 0)))
+            self.assertEqual(completion.queen_count(), 8)
+            self.assertFalse(completion.any_queens_unsafe())
+
+    def test_complete_returns_safe_full_board(self):
+        s = QueensState(40, 40, (Position(5, 17), Position(39, 3)))
+        completion = s.complete()
+        self.assertEqual(completion.queen_count(), 40)
+        self.assertFalse(completion.any_queens_unsafe())
+        self.assertTrue(completion.has_queen(Position(5, 17)))
+        self.assertTrue(completion.has_queen(Position(39, 3)))
+
+    def test_complete_fills_every_row_of_wide_board(self):
+        completions = list(QueensState(4, 6).iter_completions())
+        self.assertEqual(len(completions), 46)
+        for completion in completions:
+            self.assertEqual(sorted(q.row for q in completion.queens()), [0, 1, 2, 3])
+
+    def test_complete_finishes_large_boards(self):
+        for queens in [(), (Position(250, 3),), (Position(0, 499), Position(137, 41))]:
+            s = QueensState(500, 500, queens)
+            completion = s.complete()
+            self.assertEqual(completion.queen_count(), 500)
+            self.assertFalse(completion.any_queens_unsafe())
+            self.assertTrue(all(completion.has_queen(q) for q in queens))
+            self.assertEqual(s.complete(), completion)
+
+    def test_complete_returns_none_when_impossible(self):
+        self.assertIsNone(QueensState(3, 3).complete())
+        self.assertIsNone(QueensState(5, 4).complete())
+        self.assertIsNone(QueensState(4, 4, (Position(0, 0), Position(1, 1))).complete())
+        self.assertIsNone(QueensState(4, 4, (Position(0, 0),)).complete())
+
+    def test_complete_keeps_representation(self):
+        completion = BitboardQueensState(6, 6).complete()
+        self.assertIsInstance(completion, BitboardQueensState)
+        self.assertFalse(completion.any_queens_unsafe())
+
+
+
+class TestCanonicalForm(unittest.TestCase):
+    def test_rotations_and_reflections_share_canonical_form(self):
+        queens = [(0, 1), (1, 3), (2, 2)]
+        boards = [
+            [(r, c) for r, c in queens],
+            [(c, 3 - r) for r, c in queens],
+            [(3 - r, 3 - c) for r, c in queens],
+            [(3 - c, r) for r, c in queens],
+            [(r, 3 - c) for r, c in queens],
+            [(3 - r, c) for r, c in queens],
+            [(c, r) for r, c in queens],
+            [(3 - c, 3 - r) for r, c in queens],
+        ]
+        states = [QueensState(4, 4, tuple(Position(r, c) for r, c in board)) for board in boards]
+        canonicals = {frozenset(state.canonical().queens()) for state in states}
+        hashes = {state.canonical_hash() for state in states}
+        self.assertEqual(len(canonicals), 1)
+        self.assertEqual(len(hashes), 1)
+
+    def test_different_boards_have_different_canonical_forms(self):
+        s = QueensState(4, 4, (Position(0, 0),))
+        t = QueensState(4, 4, (Position(0, 1),))
+        self.assertNotEqual(set(s.canonical().queens()), set(t.canonical().queens()))
+        self.assertNotEqual(s.canonical_hash(), t.canonical_hash())
+
+    def test_non_square_board_is_not_rotated_a_quarter_turn(self):
+        s = QueensState(2, 3, (Position(0, 0),))
+        t = QueensState(2, 3, (Position(1, 2),))
+        u = QueensState(2, 3, (Position(0, 1),))
+        self.assertEqual(set(s.canonical().queens()), set(t.canonical().queens()))
+        self.assertNotEqual(s.canonical_hash(), u.canonical_hash())
+
+    def test_canonical_hash_depends_on_board_size(self):
+        s = QueensState(4, 4, (Position(0, 0),))
+        t = QueensState(5, 5, (Position(0, 0),))
+        self.assertNotEqual(s.canonical_hash(), t.canonical_hash())
+
+    def test_canonical_keeps_representation(self):
+        s = BitboardQueensState(4, 4, (Position(3, 3),))
+        self.assertIsInstance(s.canonical(), BitboardQueensState)
+
+
+
+class TestCanonicalQueensSet(unittest.TestCase):
+    def test_add_ignores_rotations_and_reflections(self):
+        states = CanonicalQueensSet()
+        self.assertTrue(states.add(QueensState(4, 4, (Position(0, 1),))))
+        self.assertFalse(states.add(QueensState(4, 4, (Position(1, 3),))))
+        self.assertFalse(states.add(QueensState(4, 4, (Position(3, 2),))))
+        self.assertTrue(states.add(QueensState(4, 4, (Position(1, 1),))))
+        self.assertEqual(len(states), 2)
+
+    def test_contains_finds_equivalent_boards(self):
+        states = CanonicalQueensSet([QueensState(4, 4, (Position(0, 0), Position(1, 2)))])
+        self.assertIn(QueensState(4, 4, (Position(3, 3), Position(2, 1))), states)
+        self.assertNotIn(QueensState(4, 4, (Position(0, 0), Position(1, 3))), states)
+
+    def test_iterates_over_canonical_forms(self):
+        states = CanonicalQueensSet([QueensState(3, 3, (Position(2, 2),)), QueensState(3, 3, (Position(1, 1),))])
+        self.assertEqual(sorted(tuple(state.queens()) for state in states), [((0, 0),), ((1, 1),)])
+
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,103 @@
+# test_serialization.py
+#
+# ICS 33 Fall 2025
+# Project 0: History of Modern
+#
+# Unit tests for reading and writing QueensStates with "serialization.py".
+
+from pathlib import Path
+from queens import QueensState, Position
+import serialization
+import solver
+import tempfile
+import unittest
+
+
+
+class TestSerialization(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self._path = Path(self._directory.name) / 'states.qns'
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_written_states_read_back_equal(self):
+        states = list(solver.iter_solutions(6))
+        written = serialization.write_states(self._path, iter(states), 6, 6)
+        self.assertEqual(written, 4)
+        read = list(serialization.read_states(self._path))
+        self.assertEqual([set(s.queens()) for s in read], [set(s.queens()) for s in states])
+
+    def test_rows_without_queens_read_back_empty(self):
+        state = QueensState(5, 4, (Position(1, 3), Position(4, 0)))
+        serialization.write_states(self._path, [state], 5, 4)
+        with serialization.QueensStateReader(self._path) as reader:
+            self.assertEqual((reader.rows(), reader.columns(), len(reader)), (5, 4, 1))
+            empty = reader.empty_column()
+            self.assertEqual(list(reader.record(0)), [empty, 3, empty, empty, 0])
+            self.assertEqual(set(reader.state(0).queens()), {Position(1, 3), Position(4, 0)})
+
+    def test_write_columns_without_building_states(self):
+        with self._path.open('wb') as file:
+            writer = serialization.QueensStateWriter(file, 4, 4)
+            writer.write_columns([1, 3, 0, 2])
+            writer.write_columns([-1, -1, -1, 2])
+        with serialization.QueensStateReader(self._path) as reader:
+            self.assertEqual(len(reader), 2)
+            self.assertEqual(list(reader.record(0)), [1, 3, 0, 2])
+            self.assertEqual(reader.state(1).queens(), [Position(3, 2)])
+
+    def test_columns_too_large_for_the_record_cannot_be_written(self):
+        with self._path.open('wb') as file:
+            writer = serialization.QueensStateWriter(file, 4, 4)
+            for columns in ([1, 3, 0, 4], [1, 3, 0, 70000], [1, 3, 0, 2 ** 40]):
+                with self.assertRaises(ValueError):
+                    writer.write_columns(columns)
+            self.assertEqual(writer.count(), 0)
+
+    def test_wide_boards_use_four_byte_columns(self):
+        state = QueensState(2, 70000, (Position(0, 69999),))
+        serialization.write_states(self._path, [state], 2, 70000)
+        self.assertEqual(self._path.stat().st_size, 24 + 2 * 4)
+        self.assertEqual(list(serialization.read_states(self._path))[0].queens(), [Position(0, 69999)])
+
+    def test_two_queens_in_one_row_cannot_be_written(self):
+        state = QueensState(4, 4, (Position(0, 0), Position(0, 2)))
+        with self.assertRaises(ValueError):
+            serialization.write_states(self._path, [state], 4, 4)
+
+    def test_board_of_different_size_cannot_be_written(self):
+        with self.assertRaises(ValueError):
+            serialization.write_states(self._path, [QueensState(5, 5)], 4, 4)
+
+    def test_record_index_out_of_range_raises(self):
+        serialization.write_states(self._path, [QueensState(4, 4)], 4, 4)
+        with serialization.QueensStateReader(self._path) as reader:
+            with self.assertRaises(IndexError):
+                reader.record(1)
+
+    def test_closing_with_a_record_still_in_use_closes_the_file(self):
+        serialization.write_states(self._path, [QueensState(4, 4)], 4, 4)
+        reader = serialization.QueensStateReader(self._path)
+        record = reader.record(0)
+        with self.assertRaises(BufferError):
+            reader.close()
+        self.assertTrue(reader._file.closed)
+        record.release()
+        reader.close()
+
+    def test_reading_non_queens_file_raises(self):
+        self._path.write_bytes(b'not a queens file at all, clearly')
+        with self.assertRaises(ValueError):
+            serialization.QueensStateReader(self._path)
+
+    def test_reading_empty_file_raises(self):
+        self._path.write_bytes(b'')
+        with self.assertRaises(ValueError):
+            serialization.QueensStateReader(self._path)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+# test_solver.py
+#
+# ICS 33 Fall 2025
+# Project 0: History of Modern
+#
+# Unit tests for the n-queens solvers in "solver.py".
+
+import json
+from pathlib import Path
+from queens import QueensState
+import solver
+import tempfile
+import unittest
+
+
+
+class TestIterSolutions(unittest.TestCase):
+    def test_solution_counts_match_known_values(self):
+        expected = [1, 0, 0, 2, 10, 4, 40, 92]
+        for n, count in enumerate(expected, start = 1):
+            self.assertEqual(sum(1 for _ in solver.iter_solutions(n)), count)
+
+    def test_solutions_are_safe_full_boards(self):
+        for state in solver.iter_solutions(6):
+            self.assertIsInstance(state, QueensState)
+            self.assertEqual(state.queen_count(), 6)
+            self.assertFalse(state.any_queens_unsafe())
+
+    def test_solutions_are_distinct(self):
+        solutions = [frozenset(state.queens()) for state in solver.iter_solutions(7)]
+        self.assertEqual(len(set(solutions)), len(solutions))
+
+    def test_invalid_board_size_raises(self):
+        with self.assertRaises(ValueError):
+            next(solver.iter_solutions(0))
+
+
+
+class TestSolve(unittest.TestCase):
+    def test_backtracking_finds_solution(self):
+        state = solver.solve(8)
+        self.assertEqual(state.queen_count(), 8)
+        self.assertFalse(state.any_queens_unsafe())
+
+    def test_backtracking_returns_none_when_unsolvable(self):
+        self.assertIsNone(solver.solve(3))
+
+    def test_min_conflicts_finds_solution(self):
+        for n in [1, 4, 6, 8, 50, 500]:
+            state = solver.solve(n, solver.MIN_CONFLICTS, seed = n)
+            self.assertEqual(state.queen_count(), n)
+            self.assertFalse(state.any_queens_unsafe())
+
+    def test_min_conflicts_is_repeatable_given_seed(self):
+        first = solver.solve(30, solver.MIN_CONFLICTS, seed = 7)
+        second = solver.solve(30, solver.MIN_CONFLICTS, seed = 7)
+        self.assertEqual(sorted(first.queens()), sorted(second.queens()))
+
+    def test_min_conflicts_gives_up_when_unsolvable(self):
+        self.assertIsNone(solver.solve(3, solver.MIN_CONFLICTS, seed = 0, max_steps = 500))
+
+    def test_unknown_strategy_raises(self):
+        with self.assertRaises(ValueError):
+            solver.solve(8, 'guessing')
+
+    def test_invalid_board_size_raises(self):
+        with self.assertRaises(ValueError):
+            solver.solve(-1)
+
+
+
+class TestCountSolutions(unittest.TestCase):
+    def test_counts_match_known_values(self):
+        expected = [1, 0, 0, 2, 10, 4, 40, 92, 352, 724]
+        self.assertEqual([solver.count_solutions(n) for n in range(1, 11)], expected)
+
+    def test_parallel_counts_match_known_values(self):
+        expected = [1, 0, 0, 2, 10, 4, 40, 92, 352, 724]
+        for n, count in enumerate(expected, start = 1):
+            self.assertEqual(solver.count_solutions_parallel(n, max_workers = 2).total, count)
+
+    def test_parallel_count_reports_worker_throughput(self):
+        result = solver.count_solutions_parallel(8, max_workers = 2)
+        self.assertGreater(len(result.workers), 0)
+        self.assertLessEqual(len(result.workers), 2)
+        self.assertEqual(sum(worker.subtrees for worker in result.workers), 21)
+        for worker in result.workers:
+            self.assertGreater(worker.nodes, 0)
+            self.assertGreaterEqual(worker.nodes_per_second, 0.0)
+
+    def test_invalid_board_size_raises(self):
+        with self.assertRaises(ValueError):
+            solver.count_solutions_parallel(0)
+
+
+
+class TestResumableSolutions(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self._path = Path(self._directory.name) / 'checkpoint.json'
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_generates_same_solutions_as_iter_solutions(self):
+        expected = [frozenset(state.queens()) for state in solver.iter_solutions(7)]
+        self.assertEqual([frozenset(state.queens()) for state in solver.ResumableSolutions(7)], expected)
+
+    def test_resumes_after_last_saved_solution(self):
+        expected = [frozenset(state.queens()) for state in solver.iter_solutions(8)]
+        first = solver.ResumableSolutions(8)
+        before = [frozenset(next(first).queens()) for _ in range(25)]
+        first.save(self._path)
+        next(first)
+
+        resumed = solver.ResumableSolutions.load(self._path)
+        self.assertEqual(resumed.found(), 25)
+        after = [frozenset(state.queens()) for state in resumed]
+        self.assertEqual(before + after, expected)
+        self.assertTrue(resumed.finished())
+        self.assertEqual(resumed.found(), 92)
+
+    def test_finished_search_resumes_with_nothing_left(self):
+        solutions = solver.ResumableSolutions(4)
+        self.assertEqual(len(list(solutions)), 2)
+        solutions.save(self._path)
+        self.assertEqual(list(solver.ResumableSolutions.load(self._path)), [])
+
+    def test_load_rejects_invalid_checkpoint(self):
+        self._path.write_text('{"format": 1, "found": 0}', encoding = 'utf-8')
+        with self.assertRaises(ValueError):
+            solver.ResumableSolutions.load(self._path)
+        self._path.write_text('not json', encoding = 'utf-8')
+        with self.assertRaises(ValueError):
+            solver.ResumableSolutions.load(self._path)
+
+    def test_load_rejects_inconsistent_frontier(self):
+        solutions = solver.ResumableSolutions(6)
+        next(solutions)
+        solutions.save(self._path)
+        data = json.loads(self._path.read_text(encoding = 'utf-8'))
+        data['frontier']['columns'].append(0)
+        self._path.write_text(json.dumps(data), encoding = 'utf-8')
+        with self.assertRaises(ValueError):
+            solver.ResumableSolutions.load(self._path)
+
+    def test_iter_solutions_resumable_continues_interrupted_search(self):
+        expected = [frozenset(state.queens()) for state in solver.iter_solutions(8)]
+        interrupted = solver.iter_solutions_resumable(8, self._path, interval = 0)
+        before = [frozenset(next(interrupted).queens()) for _ in range(40)]
+        interrupted.close()
+
+        after = [frozenset(state.queens()) for state in solver.iter_solutions_resumable(8, self._path)]
+        self.assertEqual(after[0], before[-1])
+        self.assertEqual(before + after[1:], expected)
+        self.assertEqual(list(solver.iter_solutions_resumable(8, self._path)), [])
+
+    def test_iter_solutions_resumable_rejects_checkpoint_for_other_n(self):
+        solver.ResumableSolutions(5).save(self._path)
+        with self.assertRaises(ValueError):
+            next(solver.iter_solutions_resumable(6, self._path))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
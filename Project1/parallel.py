@@ -0,0 +1,337 @@
+# parallel.py
+#
+# ICS 33 Fall 2025
+# Project 1: Calling All Stations
+#
+# Runs a Simulation across several worker processes, as a conservative
+# parallel discrete-event simulation, producing exactly the output that
+# Simulation.run would.
+#
+# The devices are split into partitions, each handled by one process, which
+# keeps the state of its own devices and the queue of the events happening at
+# them.  A message between devices in different partitions takes at least the
+# "lookahead" -- the smallest delay of any PROPAGATE rule between partitions
+# -- to arrive, so if the earliest pending event anywhere is at time T, every
+# partition can safely handle all of its events before T plus the lookahead:
+# nothing sent from another partition can arrive in that window.  The
+# processes handle one window at a time, after which the messages sent
+# between partitions are delivered and the next window begins.
+#
+# The sequential simulation handles events at the same time in the order in
+# which they were scheduled, which depends on the order in which their senders
+# were handled, and so on back to the initial events.  Each event therefore
+# carries a rank recording that ancestry: an initial event's is (0, its
+# position in the input), and a scheduled event's is (1, its parent's key,
+# its position among its parent's messages).  Ordering events by time, then
+# receptions before sends, then rank, is exactly the sequential order, so
+# each window's log lines can be merged across partitions by that key.  At
+# the end of each window, every parent key is replaced by the position of
+# that event in the merged log, so ranks never nest more than a window deep.
+
+from collections import defaultdict
+import heapq
+from multiprocessing import Pipe, Process
+
+from project1 import Simulation, OutputSink, _RECEIVE_FIRST
+
+
+
+# A window is never allowed to be longer than this many of the shortest
+# PROPAGATE delay, which limits how deeply ranks can nest within it.
+_MAX_HOPS_PER_WINDOW = 100
+
+
+
+def run_parallel(sim: Simulation, processes: int, partition: dict[int, int] | None = None) -> None:
+    """Runs a loaded simulation across the given number of worker processes,
+    writing the same output that sim.run() would, and leaving the same
+    cancellation state in sim afterward.  The devices are assigned to
+    processes by the given partition, mapping device ids to partition
+    numbers (with any device not in it going to partition 0), or, by
+    default, by grouping the devices joined by the shortest delays.  Raises a
+    ValueError if the simulation was given a profiler or somewhere to save
+    snapshots, neither of which a parallel run supports."""
+    if sim.profiler is not None:
+        raise ValueError('a parallel run cannot be profiled')
+    if sim.snapshot_path is not None or sim.snapshot_interval is not None:
+        raise ValueError('a parallel run cannot save snapshots')
+
+    # The partitions need every initial event up front, so a streamed file's
+    # events are all read in first
+    sim._drain_stream()
+    if partition is None:
+        partition = _partition_devices(sim, processes)
+    parts = sorted(set(partition.values()) | {0})
+    if len(parts) <= 1:
+        sim.run()
+        return
+
+    index_of = {part: index for index, part in enumerate(parts)}
+    partition_of = {device: index_of[part] for device, part in partition.items()}
+    end_offset = _window_length(sim, partition_of)
+
+    initial = [[] for _ in parts]
+    for t, priority, seq, kind, sender, payload in sim._events:
+        initial[partition_of.get(sender, 0)].append((t, priority, (0, seq), kind, sender, payload))
+    sim._events = []
+
+    tables = (sim.sim_length, sim._row_of, sim._offsets, sim._targets, sim._delays)
+    connections = []
+    workers = []
+    try:
+        for index in range(len(parts)):
+            parent_end, child_end = Pipe()
+            worker = Process(target = _serve_partition,
+                             args = (child_end, tables, index, partition_of, initial[index]), daemon = True)
+            worker.start()
+            child_end.close()
+            connections.append(parent_end)
+            workers.append(worker)
+
+        _coordinate(sim, connections, partition_of, end_offset)
+
+        for connection in connections:
+            connection.send(None)
+        for connection in connections:
+            for name, states in zip(('canceled', 'cancel_time', 'cancel_sources'), connection.recv()):
+                getattr(sim, name).update(states)
+    finally:
+        for connection in connections:
+            connection.close()
+        for worker in workers:
+            worker.join()
+
+    sim.output.line(f"@{sim.sim_length}: END")
+    sim.output.flush()
+
+
+def _coordinate(sim: Simulation, connections: list, partition_of: dict[int, int], end_offset: int | None) -> None:
+    # Drives the partitions one window at a time, writing each window's log
+    # lines in the sequential order and delivering the messages sent between
+    # partitions before the next window.
+    next_times = [connection.recv() for connection in connections]
+    incoming = [[] for _ in connections]
+    positions = [[] for _ in connections]
+    logged_count = 0
+
+    while True:
+        pending = [t for t in next_times if t is not None]
+        pending += [event[0] for events in incoming for event in events]
+        if not pending:
+            return
+        start = min(pending)
+        end = start + end_offset if end_offset is not None else None
+
+        for index, connection in enumerate(connections):
+            connection.send((end, incoming[index], positions[index]))
+
+        results = [connection.recv() for connection in connections]
+        incoming = [[] for _ in connections]
+        positions = [[] for _ in connections]
+
+        # The partitions' logs are each in key order, so merging them gives the
+        # sequential order, and each logged event's position in it stands in
+        # for its key in the ranks of its messages from now on.
+        position_of = {}
+        merged = heapq.merge(*([(key, index, lines) for key, lines in logged]
+                               for index, (logged, _, _) in enumerate(results)))
+        for key, index, lines in merged:
+            for line in lines:
+                sim.output.event(*line)
+            position_of[id(key)] = logged_count
+            positions[index].append(logged_count)
+            logged_count += 1
+
+        for index, (_, outbox, next_time) in enumerate(results):
+            next_times[index] = next_time
+            for event in outbox:
+                target = event[5][0]
+                incoming[partition_of.get(target, 0)].append(_flatten(event, position_of))
+
+
+def _flatten(event: tuple, position_of: dict[int, int]) -> tuple:
+    # Replaces the parent key in an event's rank with the parent's position
+    # in the log, if it hasn't been already.
+    t, priority, rank, kind, sender, payload = event
+    if rank[0] == 1 and rank[1] == 1:
+        rank = (1, 0, position_of[id(rank[2])], rank[3])
+    return t, priority, rank, kind, sender, payload
+
+
+def _window_length(sim: Simulation, partition_of: dict[int, int]) -> int | None:
+    # The lookahead, capped at _MAX_HOPS_PER_WINDOW of the shortest delay, or
+    # None if no message can ever arrive anywhere (so one window suffices).
+    # Rules with delays of zero or less never deliver a message, so they
+    # don't count.
+    lookahead = None
+    shortest = None
+    for src, dst, delay in zip(sim._edge_sources, sim._targets, sim._delays):
+        if delay <= 0:
+            continue
+        if shortest is None or delay < shortest:
+            shortest = delay
+        if partition_of.get(src, 0) != partition_of.get(dst, 0) and (lookahead is None or delay < lookahead):
+            lookahead = delay
+
+    if shortest is None:
+        return None
+    cap = _MAX_HOPS_PER_WINDOW * shortest
+    return cap if lookahead is None else min(lookahead, cap)
+
+
+def _partition_devices(sim: Simulation, processes: int) -> dict[int, int]:
+    # Groups devices by joining them along the rules with the shortest delays
+    # first, stopping before the longest delay at which there would be fewer
+    # groups than processes, so that the rules left between groups have delays
+    # as long as possible.  The groups are then dealt out, largest first, to
+    # whichever partition has the fewest devices so far.
+    devices = set(sim.device_ids)
+    devices.update(sim._edge_sources)
+    devices.update(sim._targets)
+    devices.update(event[4] for event in sim._events)
+    if processes <= 1 or len(devices) <= 1:
+        return {device: 0 for device in devices}
+
+    rules = sorted(zip(sim._delays, sim._edge_sources, sim._targets))
+    cutoff = _cutoff_delay(devices, rules, processes)
+
+    parent = {device: device for device in devices}
+    for delay, src, dst in rules:
+        if cutoff is not None and delay >= cutoff:
+            break
+        _union(parent, src, dst)
+
+    groups = defaultdict(list)
+    for device in devices:
+        groups[_find(parent, device)].append(device)
+
+    sizes = [0] * processes
+    partition = {}
+    for group in sorted(groups.values(), key = len, reverse = True):
+        index = sizes.index(min(sizes))
+        sizes[index] += len(group)
+        for device in group:
+            partition[device] = index
+    return partition
+
+
+def _cutoff_delay(devices: set[int], rules: list[tuple[int, int, int]], processes: int) -> int | None:
+    # Finds the smallest delay such that joining every rule with a smaller
+    # delay leaves at least as many groups as processes, but joining those
+    # with that delay too would not, or None if joining every rule does.
+    parent = {device: device for device in devices}
+    groups = len(devices)
+    i = 0
+    while i < len(rules):
+        delay = rules[i][0]
+        remaining = groups
+        j = i
+        while j < len(rules) and rules[j][0] == delay:
+            if _union(parent, rules[j][1], rules[j][2]):
+                remaining -= 1
+            j += 1
+        if remaining < processes:
+            return delay
+        groups = remaining
+        i = j
+    return None
+
+
+def _find(parent: dict[int, int], device: int) -> int:
+    root = device
+    while parent[root] != root:
+        root = parent[root]
+    while parent[device] != root:
+        parent[device], device = root, parent[device]
+    return root
+
+
+def _union(parent: dict[int, int], a: int, b: int) -> bool:
+    a = _find(parent, a)
+    b = _find(parent, b)
+    if a == b:
+        return False
+    parent[b] = a
+    return True
+
+
+
+class _Partition(Simulation):
+    """The part of a simulation that handles the events at one partition's
+    devices, collecting its log lines and the messages it sends to other
+    partitions rather than writing or scheduling them itself"""
+    def __init__(self, tables: tuple, index: int, partition_of: dict[int, int], events: list) -> None:
+        super().__init__(OutputSink(_NullFile()))
+        self.sim_length, self._row_of, self._offsets, self._targets, self._delays = tables
+        self._events = events
+        heapq.heapify(self._events)
+        self._index = index
+        self._partition_of = partition_of
+        self._logged = []
+        self._outbox = []
+        self._key = None
+        self._children = 0
+        self._lines = None
+
+    def next_time(self) -> int | None:
+        """Returns the time of the earliest pending event, or None if there is none"""
+        return self._events[0][0] if self._events else None
+
+    def advance(self, end: int | None, incoming: list, positions: list[int]) -> tuple:
+        """Handles every event before the given time (or every event, if it's
+        None), after flattening the ranks that refer to the events logged in
+        the previous window, now that their positions are known, and receiving
+        the given messages from other partitions.  Returns the events logged,
+        as (key, lines), the messages for other partitions, and the time of
+        the earliest event left."""
+        if positions:
+            position_of = {id(key): position for (key, _), position in zip(self._logged, positions)}
+            self._events = [_flatten(event, position_of) for event in self._events]
+            heapq.heapify(self._events)
+        for event in incoming:
+            heapq.heappush(self._events, event)
+
+        self._logged = []
+        self._outbox = []
+        while self._events and (end is None or self._events[0][0] < end):
+            t, priority, rank, kind, sender, payload = heapq.heappop(self._events)
+            self._key = (t, priority, rank)
+            self._children = 0
+            self._lines = []
+            self._handle(t, kind, sender, payload)
+            if self._lines:
+                self._logged.append((self._key, self._lines))
+
+        return self._logged, self._outbox, self.next_time()
+
+    def _add_event(self, time: int, kind: str, sender: int, payload: object) -> None:
+        event = (time, _RECEIVE_FIRST[kind], (1, 1, self._key, self._children), kind, sender, payload)
+        self._children += 1
+        if self._partition_of.get(payload[0], 0) == self._index:
+            heapq.heappush(self._events, event)
+        else:
+            self._outbox.append(event)
+
+    def _log_event(self, time, direction, msg_type, src, dest, msg):
+        self._lines.append((time, direction, msg_type, src, dest, msg))
+
+
+
+class _NullFile:
+    def write(self, text) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+
+
+def _serve_partition(connection, tables: tuple, index: int, partition_of: dict[int, int], events: list) -> None:
+    # The body of a worker process: handles windows as the coordinator asks,
+    # then sends back its devices' cancellation state.
+    partition = _Partition(tables, index, partition_of, events)
+    connection.send(partition.next_time())
+    while (request := connection.recv()) is not None:
+        connection.send(partition.advance(*request))
+    connection.send((dict(partition.canceled), dict(partition.cancel_time), dict(partition.cancel_sources)))
+    connection.close()
@@ -1,128 +1,607 @@
 from pathlib import Path
-from collections import defaultdict
+from array import array
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+from itertools import accumulate
+import json
+import locale
+import mmap
+import os
+import pickle
+import sys
+import time
+import zlib
+
+# Events that happen at the same time are handled receptions first, then
+# sends, and otherwise in the order they were scheduled.
+_RECEIVE_FIRST = {'recv_alert': 0, 'recv_cancel': 0, 'send_alert': 1, 'send_cancel': 1}
+
+# Snapshot files start with this, followed by the snapshot, pickled and
+# compressed.  Since unpickling can run arbitrary code, only snapshots saved
+# by a trusted source should ever be restored.
+_SNAPSHOT_MAGIC = b'ICS33SIM\x01'
+
+# Input files are parsed in chunks of about this many bytes, each ending at
+# the end of a line
+_CHUNK_SIZE = 1 << 24
+
+# When a file's events are streamed, they're read in chunks of about this many
+# bytes, so that few of them are in memory at once
+_STREAM_CHUNK_SIZE = 1 << 20
+
+def _int_array(values = ()) -> array | list:
+    """Returns the given integers as a compact array of 64-bit integers, or as
+    a list if any of them doesn't fit in one"""
+    values = list(values)
+    try:
+        return array('q', values)
+    except OverflowError:
+        return values
+
+def _extend_ints(values: array | list, more: array | list) -> array | list:
+    """Extends a sequence made by _int_array with another, returning the
+    sequence extended, which is a list copied from it if the other is a list
+    (i.e., has values that don't fit in an array)"""
+    if isinstance(values, array) and not isinstance(more, array):
+        values = list(values)
+    values.extend(more)
+    return values
+
+def _chunk_bounds(path: Path, chunk_size: int | None = None) -> list[tuple[int, int]]:
+    """Splits the file at the given path into chunks of about the given number
+    of bytes (_CHUNK_SIZE by default) that each end at the end of a line,
+    returning the start and end of each"""
+    if chunk_size is None:
+        chunk_size = _CHUNK_SIZE
+    with path.open('rb') as f:
+        size = f.seek(0, 2)
+        if size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as data:
+            bounds = []
+            start = 0
+            while start < size:
+                newline = data.find(b'\n', min(start + chunk_size, size) - 1)
+                stop = size if newline < 0 else newline + 1
+                bounds.append((start, stop))
+                start = stop
+            return bounds
+
+def _parse_chunk(path: Path, start: int, stop: int, encoding: str) -> tuple:
+    """Parses the lines from start to stop in the file at the given path,
+    returning the last LENGTH (or None), the DEVICE ids, the sources, targets
+    and delays of the PROPAGATE rules, and the ALERT and CANCEL events as
+    (time, kind, device, message), all in the order they appear.  The lines
+    are handled exactly as they would be if read one at a time from the file
+    opened as text, so any error is the one that doing so would raise."""
+    with path.open('rb') as f, mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as data:
+        text = data[start:stop].decode(encoding)
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+
+    length = None
+    devices = []
+    sources = []
+    targets = []
+    delays = []
+    events = []
+    for line in text.split('\n'):
+        # Splitting a line ignores the whitespace around it, so its first part
+        # starts a comment exactly when the stripped line does
+        parts = line.split()
+        if not parts or parts[0].startswith('#'):
+            continue
+        cmd = parts[0]
+        if cmd == 'PROPAGATE':
+            src, dst, delay = map(int, parts[1:])
+            sources.append(src)
+            targets.append(dst)
+            delays.append(delay)
+        elif cmd == 'ALERT':
+            dev, msg, t = int(parts[1]), parts[2], int(parts[3])
+            events.append((t, 'send_alert', dev, msg))
+        elif cmd == 'CANCEL':
+            dev, msg, t = int(parts[1]), parts[2], int(parts[3])
+            events.append((t, 'send_cancel', dev, msg))
+        elif cmd == 'DEVICE':
+            devices.append(int(parts[1]))
+        elif cmd == 'LENGTH':
+            length = int(parts[1])
+    return length, _int_array(devices), _int_array(sources), _int_array(targets), _int_array(delays), events
+
+def _parse_chunks(path: Path, bounds: list[tuple[int, int]], encoding: str, workers: int):
+    """Generates the results of parsing each of the given chunks of the file at
+    the given path, in order, using the given number of worker processes if
+    more than one"""
+    if workers > 1 and len(bounds) > 1:
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+            futures = [executor.submit(_parse_chunk, path, start, stop, encoding) for start, stop in bounds]
+            for future in futures:
+                yield future.result()
+    else:
+        for start, stop in bounds:
+            yield _parse_chunk(path, start, stop, encoding)
+
+def _stream_events(path: Path, encoding: str, first: int):
+    """Generates the ALERT and CANCEL events in the file at the given path as
+    queue entries, numbering them in order starting from the given number,
+    reading only a small chunk of the file at a time"""
+    seq = first
+    for start, stop in _chunk_bounds(path, _STREAM_CHUNK_SIZE):
+        for t, kind, dev, msg in _parse_chunk(path, start, stop, encoding)[5]:
+            yield t, _RECEIVE_FIRST[kind], seq, kind, dev, msg
+            seq += 1
+
+class OutputSink:
+    """Writes the simulation's log to a file, standard output by default,
+    gathering lines into large blocks rather than writing each one as it
+    happens.  In binary mode the file is written UTF-8 encoded bytes; in
+    compact mode each event is written as tab-separated fields (time, SENT or
+    RECEIVED, message type, sender, receiver, message) instead of a sentence."""
+    def __init__(self, file = None, *, buffer_lines: int = 65536, binary: bool = False,
+                 compact: bool = False) -> None:
+        self._file = file if file is not None else sys.stdout
+        self._buffer_lines = max(1, buffer_lines)
+        self._binary = binary
+        self._compact = compact
+        self._lines = []
+        # How many lines have been written to the file so far
+        self.lines_written = 0
+
+    def event(self, time: int, direction: str, msg_type: str, src: int, dest: int, msg: str) -> None:
+        """Logs one message being sent or received"""
+        if self._compact:
+            verb = 'SENT' if direction == 'send' else 'RECEIVED'
+            self.line(f'{time}\t{verb}\t{msg_type}\t{src}\t{dest}\t{msg}')
+        elif direction == 'send':
+            self.line(f'@{time}: #{src} SENT {msg_type} TO #{dest}: {msg}')
+        else:
+            self.line(f'@{time}: #{dest} RECEIVED {msg_type} FROM #{src}: {msg}')
+
+    def line(self, text: str) -> None:
+        """Logs one line of text"""
+        self._lines.append(text)
+        if len(self._lines) >= self._buffer_lines:
+            self._write_lines()
+
+    def flush(self) -> None:
+        """Writes every line logged so far and flushes the file"""
+        self._write_lines()
+        self._file.flush()
+
+    def _write_lines(self) -> None:
+        if self._lines:
+            text = '\n'.join(self._lines) + '\n'
+            self._file.write(text.encode('utf-8') if self._binary else text)
+            self.lines_written += len(self._lines)
+            self._lines.clear()
+
+class Profiler:
+    """Collects statistics about a simulation while it runs: how many events
+    of each kind are handled, how deep the queue gets (sampled every
+    sample_every events), how many messages each device sends, how many
+    events are handled per second, and how much time goes to handling
+    events, logging and scheduling.  When the simulation ends, even by
+    raising an exception, they're written as JSON to the given file
+    (standard error by default) and kept as summary.  If a progress
+    interval is given, a line describing the progress so far is written to
+    standard error about that often, in seconds, checked after every event
+    regardless of sample_every."""
+    def __init__(self, file = None, *, sample_every: int = 1024, progress_interval: float | None = None) -> None:
+        self._file = file
+        self._sample_every = max(1, sample_every)
+        self._progress_interval = progress_interval
+        self.summary = None
+
+    def start(self, sim: 'Simulation') -> None:
+        """Starts collecting statistics about the given simulation, by wrapping
+        its handling, scheduling and logging of events"""
+        self._kinds = Counter()
+        self._sent = Counter()
+        self._samples = []
+        self._handled = 0
+        self._max_depth = len(sim._events)
+        self._logging = self._scheduling = self._handling = 0.0
+        self._started = time.perf_counter()
+        self._next_progress = None
+        if self._progress_interval is not None:
+            self._next_progress = self._started + self._progress_interval
+
+        handle, add_event, log_event = sim._handle, sim._add_event, sim._log_event
+        clock = time.perf_counter
+
+        def timed_handle(t, kind, sender, payload):
+            started = clock()
+            handle(t, kind, sender, payload)
+            finished = clock()
+            self._handling += finished - started
+            self._kinds[kind] += 1
+            self._handled += 1
+            if self._handled % self._sample_every == 0:
+                self._samples.append([t, len(sim._events)])
+            if self._next_progress is not None and finished >= self._next_progress:
+                self._next_progress = finished + self._progress_interval
+                self._progress(t, len(sim._events), finished)
+
+        def timed_add_event(t, kind, sender, payload):
+            started = clock()
+            add_event(t, kind, sender, payload)
+            self._scheduling += clock() - started
+            if len(sim._events) > self._max_depth:
+                self._max_depth = len(sim._events)
+
+        def timed_log_event(t, direction, msg_type, src, dest, msg):
+            started = clock()
+            log_event(t, direction, msg_type, src, dest, msg)
+            self._logging += clock() - started
+            if direction == 'send':
+                self._sent[src] += 1
+
+        sim._handle = timed_handle
+        sim._add_event = timed_add_event
+        sim._log_event = timed_log_event
+
+    def finish(self, sim: 'Simulation') -> None:
+        """Stops collecting statistics about the given simulation, then writes
+        and keeps the summary of them"""
+        elapsed = time.perf_counter() - self._started
+        del sim._handle, sim._add_event, sim._log_event
+        handled = self._handled
+        self.summary = {
+            'length': sim.sim_length,
+            'events': handled,
+            'events_by_kind': dict(self._kinds),
+            'seconds': elapsed,
+            'events_per_second': handled / elapsed if elapsed > 0 else None,
+            'handling_seconds': self._handling,
+            'logging_seconds': self._logging,
+            'scheduling_seconds': self._scheduling,
+            'max_queue_depth': self._max_depth,
+            'queue_depth': self._samples,
+            'messages_sent_by_device': {str(device): count for device, count in self._sent.items()},
+            'rules_by_device': {str(device): count for device, count in Counter(sim._edge_sources).items()},
+        }
+        file = self._file if self._file is not None else sys.stderr
+        file.write(json.dumps(self.summary) + '\n')
+        file.flush()
+
+    def _progress(self, t: int, depth: int, now: float) -> None:
+        rate = self._handled / (now - self._started)
+        print(f'@{t}: {self._handled} events handled, {depth} queued, {rate:.0f} events/s',
+              file = sys.stderr, flush = True)
 
 class Simulation:
-    def __init__(self) -> None:
+    """A simulation of devices passing alerts and cancellations along.  When
+    given a Profiler, run collects statistics with it.  When given a snapshot
+    path and interval, run saves a snapshot to that path whenever the
+    simulation reaches a multiple of the interval, from which a later run can
+    resume; the interval must be positive."""
+    def __init__(self, output: OutputSink | None = None, *, profiler: Profiler | None = None,
+                 snapshot_path: Path | None = None, snapshot_interval: int | None = None) -> None:
+        if snapshot_interval is not None and snapshot_interval <= 0:
+            raise ValueError(f'snapshot interval must be positive, not {snapshot_interval}')
+        self.output = output if output is not None else OutputSink()
+        self.profiler = profiler
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        # Every event before this time has been handled
+        self.clock = 0
         self.sim_length = 0
-        self.propagation = defaultdict(list)
-        self.device_ids = set()
-        self._events_by_time = defaultdict(list)
+        self.device_ids = _int_array()
+        # The PROPAGATE rules, in the order they were read, as parallel arrays
+        self._edge_sources = _int_array()
+        self._edge_targets = _int_array()
+        self._edge_delays = _int_array()
+        # The same rules grouped by source in compressed sparse row form: the
+        # rules for the source in row r are those from _offsets[r] up to (but
+        # not including) _offsets[r + 1] in _targets and _delays (see
+        # _build_tables for how sources are given rows)
+        self._row_of = None
+        self._offsets = _int_array([0])
+        self._targets = _int_array()
+        self._delays = _int_array()
+        self._events = []
+        self._scheduled = 0
+        # The next event from a streamed file that hasn't been queued yet,
+        # and the rest of them
+        self._upcoming = None
+        self._stream = None
         self.canceled = defaultdict(set)
         self.cancel_time = defaultdict(dict)
         self.cancel_sources = defaultdict(set)
 
-    def load_file(self, path: Path) -> None:
+    def load_file(self, path: Path, workers: int = 1, *, stream: bool = False) -> None:
+        """Loads a scenario, printing FILE NOT FOUND and exiting if it can't be
+        read or has a malformed number in it.  The file is memory-mapped and
+        parsed in large chunks, by the given number of worker processes if
+        more than one; either way, the result is the same as reading it one
+        line at a time.
+
+        When streaming, if the file's ALERT and CANCEL commands are in order
+        of time, they aren't loaded; instead, run reads them from the file as
+        the simulation reaches their times, so that only the events in flight
+        are ever in memory.  (If they're out of order, they're loaded as
+        usual.)"""
+        self._drain_stream()
         try:
-            with path.open('r') as f:
-                for raw in f:
-                    line = raw.strip()
-                    if not line or line.startswith('#'):
-                        continue
-                    parts = line.split()
-                    cmd = parts[0]
-                    if cmd == 'LENGTH':
-                        self.sim_length = int(parts[1])
-                    elif cmd == 'DEVICE':
-                        dev = int(parts[1])
-                        self.device_ids.add(dev)
-                    elif cmd == 'PROPAGATE':
-                        src, dst, delay = map(int, parts[1:])
-                        self.propagation[src].append((dst, delay))
-                    elif cmd == 'ALERT':
-                        dev, msg, t = int(parts[1]), parts[2], int(parts[3])
-                        self._add_event(t, 'send_alert', dev, msg)
-                    elif cmd == 'CANCEL':
-                        dev, msg, t = int(parts[1]), parts[2], int(parts[3])
-                        self._add_event(t, 'send_cancel', dev, msg)
+            # The same encoding that open() would use for a text file
+            encoding = 'utf-8' if sys.flags.utf8_mode else locale.getpreferredencoding(False)
+            # Streaming keeps the chunks small, since even the events just being
+            # counted are briefly in memory
+            bounds = _chunk_bounds(path, _STREAM_CHUNK_SIZE if stream else None)
+            first = self._scheduled
+            count = 0
+            latest = None
+            in_order = True
+            for length, devices, sources, targets, delays, events in _parse_chunks(path, bounds, encoding, workers):
+                self._load_chunk(length, devices, sources, targets, delays)
+                if not stream:
+                    self._load_events(events)
+                    continue
+                # Only how many events there are, and whether they're in order,
+                # matters until they're streamed
+                count += len(events)
+                for t, _, _, _ in events:
+                    if latest is not None and t < latest:
+                        in_order = False
+                    latest = t
+            if stream and not in_order:
+                for start, stop in bounds:
+                    self._load_events(_parse_chunk(path, start, stop, encoding)[5])
         except (FileNotFoundError, OSError, ValueError):
             print('FILE NOT FOUND')
             raise SystemExit(0)
+        if stream and in_order and count > 0:
+            # The streamed events are numbered before any that are scheduled
+            # while running, just as they would be if they were loaded
+            self._stream = _stream_events(path, encoding, first)
+            self._upcoming = next(self._stream)
+            self._scheduled = first + count
+        heapq.heapify(self._events)
+        self._build_tables()
+
+    def _load_chunk(self, length, devices, sources, targets, delays) -> None:
+        if length is not None:
+            self.sim_length = length
+        self.device_ids = _extend_ints(self.device_ids, devices)
+        self._edge_sources = _extend_ints(self._edge_sources, sources)
+        self._edge_targets = _extend_ints(self._edge_targets, targets)
+        self._edge_delays = _extend_ints(self._edge_delays, delays)
+
+    def _load_events(self, events) -> None:
+        # The events go onto the end of the queue, which load_file turns back
+        # into a heap afterward
+        for t, kind, dev, msg in events:
+            self._events.append((t, _RECEIVE_FIRST[kind], self._scheduled, kind, dev, msg))
+            self._scheduled += 1
+
+    def _drain_stream(self) -> None:
+        # Queues every event not yet read from a streamed file
+        if self._upcoming is not None:
+            self._events.append(self._upcoming)
+            self._events.extend(self._stream)
+            self._upcoming = self._stream = None
+            heapq.heapify(self._events)
+
+    def _build_tables(self) -> None:
+        # Sorts the devices, dropping duplicates, and groups the PROPAGATE rules
+        # by source, keeping each source's rules in the order they were read.
+        # The grouped rules then stand in for the rules as read, since
+        # grouping them again (after another file is loaded) gives the same
+        # order.
+        self.device_ids = _int_array(sorted(set(self.device_ids)))
+        sources = self._edge_sources
+        order = sorted(range(len(sources)), key = sources.__getitem__)
+        self._edge_sources = _int_array(map(sources.__getitem__, order))
+        self._edge_targets = self._targets = _int_array(map(self._edge_targets.__getitem__, order))
+        self._edge_delays = self._delays = _int_array(map(self._edge_delays.__getitem__, order))
+
+        # Device ids are usually small non-negative integers, in which case
+        # each source's id is its row, and sources without rules get empty
+        # rows; otherwise, _row_of maps each source to its row
+        counts = Counter(self._edge_sources)
+        dense = not counts or (self._edge_sources[0] >= 0 and self._edge_sources[-1] < 2 * len(counts) + 1024)
+        if dense:
+            self._row_of = None
+            rows = [0] * (self._edge_sources[-1] + 1 if counts else 0)
+            for src, count in counts.items():
+                rows[src] = count
+        else:
+            self._row_of = dict(zip(counts, range(len(counts))))
+            rows = counts.values()
+        self._offsets = _int_array(accumulate(rows, initial = 0))
 
     def _add_event(self, time: int, kind: str, sender: int, payload: object) -> None:
-        self._events_by_time[time].append((kind, sender, payload))
+        heapq.heappush(self._events, (time, _RECEIVE_FIRST[kind], self._scheduled, kind, sender, payload))
+        self._scheduled += 1
 
-    @staticmethod
-    def _sort_key(event_tuple):
-        kind = event_tuple[0]
-        return 0 if kind.startswith('recv') else 1
+    def _forward(self, time: int, kind: str, sender: int, msg_type: str, msg: str) -> None:
+        # A message only ever arrives after it was sent (the time being handled
+        # has already been taken off the queue) and before the simulation ends,
+        # so one sent along a rule with a delay of zero or less never arrives,
+        # though the send is logged regardless.
+        if self._row_of is not None:
+            row = self._row_of.get(sender)
+            if row is None:
+                return
+        elif 0 <= sender < len(self._offsets) - 1:
+            row = sender
+        else:
+            return
+        start, stop = self._offsets[row], self._offsets[row + 1]
+        for target, delay in zip(self._targets[start:stop], self._delays[start:stop]):
+            arrival = time + delay
+            if time < arrival < self.sim_length:
+                self._add_event(arrival, kind, sender, (target, msg))
+            self._log_event(time, 'send', msg_type, sender, target, msg)
 
-    @staticmethod
-    def _log_event(time, direction, msg_type, src, dest, msg):
-        left_id = src if direction == 'send' else dest
-        verb = 'SENT' if direction == 'send' else 'RECEIVED'
-        right_phrase = (f'TO #{dest}') if direction == 'send' else (f'FROM #{src}')
-        print(f"@{time}: #{left_id} {verb} {msg_type} {right_phrase}: {msg}")
+    def _log_event(self, time, direction, msg_type, src, dest, msg):
+        self.output.event(time, direction, msg_type, src, dest, msg)
 
     def run(self) -> None:
-        times = sorted(self._events_by_time.keys())
-        i = 0
-        while i < len(times):
-            t = times[i]
-            events = sorted(self._events_by_time[t], key = self._sort_key)
-
-            for kind, sender, payload in events:
-                if kind == 'send_alert':
-                    msg = payload
-                    for target, delay in self.propagation.get(sender, []):
-                        arrival = t + delay
-                        if arrival < self.sim_length:
-                            self._add_event(arrival, 'recv_alert', sender, (target, msg))
-                            if arrival not in times:
-                                times.append(arrival)
-                        self._log_event(t, 'send', 'ALERT', sender, target, msg)
-
-                elif kind == 'recv_alert':
-                    receiver, msg = payload
-                    cutoff = self.cancel_time[receiver].get(msg, -1)
-                    self._log_event(t, 'receive', 'ALERT', sender, receiver, msg)
-                    if msg in self.canceled[receiver] and t >= cutoff + 1:
-                        continue
-                    for target, delay in self.propagation.get(receiver, []):
-                        arrival = t + delay
-                        if arrival < self.sim_length:
-                            self._add_event(arrival, 'recv_alert', receiver, (target, msg))
-                            if arrival not in times:
-                                times.append(arrival)
-                        self._log_event(t, 'send', 'ALERT', receiver, target, msg)
-
-                elif kind == 'send_cancel':
-                    msg = payload
-                    if msg not in self.canceled[sender]:
-                        self.canceled[sender].add(msg)
-                        self.cancel_time[sender][msg] = t
-                    for target, delay in self.propagation.get(sender, []):
-                        arrival = t + delay
-                        if arrival < self.sim_length:
-                            self._add_event(arrival, 'recv_cancel', sender, (target, msg))
-                            if arrival not in times:
-                                times.append(arrival)
-                        self._log_event(t, 'send', 'CANCELLATION', sender, target, msg)
-
-                elif kind == 'recv_cancel':
-                    receiver, msg = payload
-                    if msg in self.canceled[receiver] and t >= self.cancel_time[receiver].get(msg,
-                                                                                              -1) + 1:
-                        self._log_event(t, 'receive', 'CANCELLATION', sender, receiver, msg)
-                        continue
-                    if (sender, msg) in self.cancel_sources[receiver]:
-                        continue
-                    self.cancel_sources[receiver].add((sender, msg))
-                    if msg not in self.canceled[receiver]:
-                        self.canceled[receiver].add(msg)
-                        self.cancel_time[receiver][msg] = t
-                    self._log_event(t, 'receive', 'CANCELLATION', sender, receiver, msg)
-                    for target, delay in self.propagation.get(receiver, []):
-                        arrival = t + delay
-                        if arrival < self.sim_length:
-                            self._add_event(arrival, 'recv_cancel', receiver, (target, msg))
-                            if arrival not in times:
-                                times.append(arrival)
-                        self._log_event(t, 'send', 'CANCELLATION', receiver, target, msg)
-
-            i += 1
-            times.sort()
-
-        print(f"@{self.sim_length}: END")
+        if self.profiler is not None:
+            self.profiler.start(self)
+        try:
+            if self.snapshot_path is None or self.snapshot_interval is None:
+                self._run_until(None)
+            else:
+                # The intervals without any events in them are skipped
+                interval = self.snapshot_interval
+                while self._events or self._upcoming is not None:
+                    earliest = min(event[0] for event in (self._events[:1] + [self._upcoming]) if event is not None)
+                    self.clock = max(self.clock, (earliest // interval + 1) * interval)
+                    self._run_until(self.clock)
+                    if self._events or self._upcoming is not None:
+                        self.save_snapshot(self.snapshot_path)
+
+            self.output.line(f"@{self.sim_length}: END")
+            self.output.flush()
+        finally:
+            # The profiler's wrappers are removed however the run ends
+            if self.profiler is not None:
+                self.profiler.finish(self)
+
+    def _run_until(self, end: int | None) -> None:
+        # Handles every event before the given time, or every event if it's
+        # None.  While a file is being streamed, every streamed event at or
+        # before the time of the next event is queued before it's handled, so
+        # they're handled in the same order as if they'd all been loaded.
+        events = self._events
+        upcoming = self._upcoming
+        while upcoming is not None:
+            if not events or upcoming[0] <= events[0][0]:
+                heapq.heappush(events, upcoming)
+                upcoming = next(self._stream, None)
+                continue
+            if end is not None and events[0][0] >= end:
+                break
+            t, _, _, kind, sender, payload = heapq.heappop(events)
+            self._handle(t, kind, sender, payload)
+        self._upcoming = upcoming
+        if upcoming is None:
+            self._stream = None
+
+        if end is None:
+            while events:
+                t, _, _, kind, sender, payload = heapq.heappop(events)
+                self._handle(t, kind, sender, payload)
+        else:
+            while events and events[0][0] < end:
+                t, _, _, kind, sender, payload = heapq.heappop(events)
+                self._handle(t, kind, sender, payload)
+
+    def save_snapshot(self, path: Path) -> None:
+        """Saves the state of the simulation -- its queue of events, its
+        devices' cancellations and its clock -- to the given path, after
+        writing all of the output logged so far.  The file is replaced only
+        once the new snapshot is completely written, so a run killed while
+        saving one leaves the previous one intact."""
+        self.output.flush()
+        state = {
+            'scenario': self._scenario_summary(),
+            'clock': self.clock,
+            'scheduled': self._scheduled,
+            # Streamed events numbered from here on haven't been queued yet
+            'stream_position': self._upcoming[2] if self._upcoming is not None else None,
+            'events': self._events,
+            'canceled': dict(self.canceled),
+            'cancel_time': dict(self.cancel_time),
+            'cancel_sources': dict(self.cancel_sources),
+            'lines_written': self.output.lines_written,
+        }
+        # The fastest compression does nearly as well as the best here, and
+        # snapshots are taken while the simulation waits
+        data = _SNAPSHOT_MAGIC + zlib.compress(pickle.dumps(state, pickle.HIGHEST_PROTOCOL), 1)
+        partial = path.with_name(path.name + '.partial')
+        partial.write_bytes(data)
+        os.replace(partial, path)
+
+    def restore_snapshot(self, path: Path) -> int:
+        """Restores the state of the simulation from a snapshot saved at the
+        given path, after loading the same scenario it was saved from, so that
+        run continues from where the snapshot was taken.  Returns how many
+        lines of output had been written when it was taken, so that any
+        written afterward can be discarded.  Raises a ValueError if the file
+        isn't a snapshot, is truncated or corrupt, or was saved from a
+        different scenario.
+
+        Snapshots are pickled, and unpickling one can run arbitrary code, so
+        only restore snapshots saved by this program somewhere no one else
+        could have written to."""
+        data = path.read_bytes()
+        if not data.startswith(_SNAPSHOT_MAGIC):
+            raise ValueError(f'{path} is not a simulation snapshot')
+        try:
+            state = pickle.loads(zlib.decompress(data[len(_SNAPSHOT_MAGIC):]))
+        except (zlib.error, pickle.UnpicklingError, EOFError) as e:
+            raise ValueError(f'{path} is a truncated or corrupt snapshot') from e
+        if not isinstance(state, dict):
+            raise ValueError(f'{path} is a truncated or corrupt snapshot')
+        if state.get('scenario') != self._scenario_summary():
+            raise ValueError(f'{path} is a snapshot of a different scenario')
+
+        # The events from the file that hadn't been queued yet when the
+        # snapshot was taken are still to come, whether they're streamed or
+        # were all loaded
+        position = state['stream_position']
+        if position is None:
+            self._upcoming = self._stream = None
+            unqueued = []
+        elif self._upcoming is not None:
+            while self._upcoming is not None and self._upcoming[2] < position:
+                self._upcoming = next(self._stream, None)
+            unqueued = []
+        else:
+            unqueued = [event for event in self._events if event[2] >= position]
+
+        self._events = state['events'] + unqueued
+        heapq.heapify(self._events)
+        self.clock = state['clock']
+        self._scheduled = state['scheduled']
+        self.canceled = defaultdict(set, state['canceled'])
+        self.cancel_time = defaultdict(dict, state['cancel_time'])
+        self.cancel_sources = defaultdict(set, state['cancel_sources'])
+        return state['lines_written']
+
+    def _scenario_summary(self) -> tuple:
+        # Enough about the loaded scenario to tell whether a snapshot came
+        # from a different one
+        return self.sim_length, len(self.device_ids), len(self._targets), sum(self._delays)
+
+    def _handle(self, t: int, kind: str, sender: int, payload: object) -> None:
+        if kind == 'send_alert':
+            self._forward(t, 'recv_alert', sender, 'ALERT', payload)
+
+        elif kind == 'recv_alert':
+            receiver, msg = payload
+            cutoff = self.cancel_time[receiver].get(msg, -1)
+            self._log_event(t, 'receive', 'ALERT', sender, receiver, msg)
+            if msg in self.canceled[receiver] and t >= cutoff + 1:
+                return
+            self._forward(t, 'recv_alert', receiver, 'ALERT', msg)
+
+        elif kind == 'send_cancel':
+            msg = payload
+            if msg not in self.canceled[sender]:
+                self.canceled[sender].add(msg)
+                self.cancel_time[sender][msg] = t
+            self._forward(t, 'recv_cancel', sender, 'CANCELLATION', msg)
+
+        elif kind == 'recv_cancel':
+            receiver, msg = payload
+            if msg in self.canceled[receiver] and t >= self.cancel_time[receiver].get(msg,
+                                                                                      -1) + 1:
+                self._log_event(t, 'receive', 'CANCELLATION', sender, receiver, msg)
+                return
+            if (sender, msg) in self.cancel_sources[receiver]:
+                return
+            self.cancel_sources[receiver].add((sender, msg))
+            if msg not in self.canceled[receiver]:
+                self.canceled[receiver].add(msg)
+                self.cancel_time[receiver][msg] = t
+            self._log_event(t, 'receive', 'CANCELLATION', sender, receiver, msg)
+            self._forward(t, 'recv_cancel', receiver, 'CANCELLATION', msg)
 
 def _read_input_file_path() -> Path:
     """Reads the input file path from the standard input"""
@@ -1,7 +1,12 @@
 import unittest
 from pathlib import Path
+import io
+import json
+import pickle
 import sys
+import zlib
 import project1
+import parallel
 
 
 class DummyIO:
@@ -260,6 +265,497 @@ class TestProject1(unittest.TestCase):
         self.assertIn('@0: #1 SENT ALERT TO #2: Q', lines)
         self.assertNotIn('@10: #2 RECEIVED ALERT FROM #1: Q', lines)
 
+    def test_delays_of_zero_or_less_log_send_once_and_never_arrive(self):
+        content = (
+            'LENGTH 20\n'
+            'DEVICE 1\n'
+            'DEVICE 2\n'
+            'DEVICE 3\n'
+            'PROPAGATE 1 2 -5\n'
+            'PROPAGATE 1 3 0\n'
+            'ALERT 1 N 10\n'
+        )
+        p = self._write_file('negative_delay.txt', content)
+        try:
+            project1.input = lambda: str(p)
+            out = self.capture_stdout(project1.main)
+        finally:
+            p.unlink(missing_ok = True)
+        self.assertEqual(out.splitlines(), [
+            '@10: #1 SENT ALERT TO #2: N',
+            '@10: #1 SENT ALERT TO #3: N',
+            '@20: END',
+        ])
+
+    def test_same_time_events_keep_scheduling_order(self):
+        content = (
+            'LENGTH 25\n'
+            'DEVICE 1\n'
+            'DEVICE 2\n'
+            'DEVICE 3\n'
+            'PROPAGATE 1 3 10\n'
+            'PROPAGATE 2 3 5\n'
+            'PROPAGATE 3 1 10\n'
+            'ALERT 3 Y 10\n'
+            'ALERT 1 X 0\n'
+            'ALERT 2 X 5\n'
+        )
+        p = self._write_file('same_time_order.txt', content)
+        try:
+            project1.input = lambda: str(p)
+            out = self.capture_stdout(project1.main)
+        finally:
+            p.unlink(missing_ok = True)
+
+        expected = [
+            '@0: #1 SENT ALERT TO #3: X',
+            '@5: #2 SENT ALERT TO #3: X',
+            '@10: #3 RECEIVED ALERT FROM #1: X',
+            '@10: #3 SENT ALERT TO #1: X',
+            '@10: #3 RECEIVED ALERT FROM #2: X',
+            '@10: #3 SENT ALERT TO #1: X',
+            '@10: #3 SENT ALERT TO #1: Y',
+            '@20: #1 RECEIVED ALERT FROM #3: X',
+            '@20: #1 SENT ALERT TO #3: X',
+            '@20: #1 RECEIVED ALERT FROM #3: X',
+            '@20: #1 SENT ALERT TO #3: X',
+            '@20: #1 RECEIVED ALERT FROM #3: Y',
+            '@20: #1 SENT ALERT TO #3: Y',
+            '@25: END',
+        ]
+        self.assertEqual(out.splitlines(), expected)
+
+    def _run_with_output(self, name: str, content: str, output) -> None:
+        p = self._write_file(name, content)
+        try:
+            sim = project1.Simulation(output)
+            sim.load_file(p)
+            sim.run()
+        finally:
+            p.unlink(missing_ok = True)
+
+    def test_output_is_buffered_until_end(self):
+        buf = DummyIO()
+        sink = project1.OutputSink(buf)
+        sink.event(0, 'send', 'ALERT', 1, 2, 'X')
+        self.assertEqual(buf.getvalue(), '')
+        sink.line('@10: END')
+        sink.flush()
+        self.assertEqual(buf.getvalue(), '@0: #1 SENT ALERT TO #2: X\n@10: END\n')
+
+    def test_output_written_when_buffer_fills(self):
+        buf = DummyIO()
+        sink = project1.OutputSink(buf, buffer_lines = 2)
+        sink.event(0, 'send', 'ALERT', 1, 2, 'X')
+        sink.event(5, 'receive', 'ALERT', 1, 2, 'X')
+        self.assertEqual(buf.getvalue(), '@0: #1 SENT ALERT TO #2: X\n@5: #2 RECEIVED ALERT FROM #1: X\n')
+
+    def test_binary_output_matches_text_output(self):
+        content = (
+            'LENGTH 30\n'
+            'DEVICE 1\n'
+            'DEVICE 2\n'
+            'PROPAGATE 1 2 10\n'
+            'ALERT 1 Caf\u00e9 0\n'
+        )
+        text = io.StringIO()
+        binary = io.BytesIO()
+        self._run_with_output('binary_out.txt', content, project1.OutputSink(text))
+        self._run_with_output('binary_out.txt', content, project1.OutputSink(binary, binary = True))
+        self.assertEqual(binary.getvalue(), text.getvalue().encode('utf-8'))
+
+    def test_compact_output_uses_tab_separated_fields(self):
+        content = (
+            'LENGTH 30\n'
+            'DEVICE 1\n'
+            'DEVICE 2\n'
+            'PROPAGATE 1 2 10\n'
+            'CANCEL 1 M 0\n'
+        )
+        out = io.StringIO()
+        self._run_with_output('compact_out.txt', content, project1.OutputSink(out, compact = True))
+        self.assertEqual(out.getvalue().splitlines(), [
+            '0\tSENT\tCANCELLATION\t1\t2\tM',
+            '10\tRECEIVED\tCANCELLATION\t1\t2\tM',
+            '@30: END',
+        ])
+
+    def test_rules_keep_file_order_per_source(self):
+        content = (
+            'LENGTH 50\n'
+            'PROPAGATE 2 1 10\n'
+            'PROPAGATE 1 3 10\n'
+            'PROPAGATE 2 3 5\n'
+            'PROPAGATE 1 2 10\n'
+            'ALERT 2 K 0\n'
+        )
+        out = io.StringIO()
+        self._run_with_output('rule_order.txt', content, project1.OutputSink(out))
+        self.assertEqual(out.getvalue().splitlines()[:2], ['@0: #2 SENT ALERT TO #1: K', '@0: #2 SENT ALERT TO #3: K'])
+        self.assertIn('@10: #1 SENT ALERT TO #3: K', out.getvalue().splitlines())
+
+    def test_sparse_negative_and_huge_device_ids(self):
+        for a, b in ((-7, 3), (10 ** 9, 1), (2 ** 70, 2 ** 70 + 1)):
+            content = (
+                'LENGTH 30\n'
+                f'DEVICE {a}\n'
+                f'DEVICE {b}\n'
+                f'PROPAGATE {a} {b} 10\n'
+                f'ALERT {a} S 0\n'
+            )
+            out = io.StringIO()
+            self._run_with_output('sparse_ids.txt', content, project1.OutputSink(out))
+            self.assertEqual(out.getvalue().splitlines(), [
+                f'@0: #{a} SENT ALERT TO #{b}: S',
+                f'@10: #{b} RECEIVED ALERT FROM #{a}: S',
+                '@30: END',
+            ])
+
+    def test_device_table_is_sorted_without_duplicates(self):
+        p = self._write_file('devices.txt', 'LENGTH 5\nDEVICE 3\nDEVICE 1\nDEVICE 3\n')
+        try:
+            sim = project1.Simulation(project1.OutputSink(DummyIO()))
+            sim.load_file(p)
+        finally:
+            p.unlink(missing_ok = True)
+        self.assertEqual(list(sim.device_ids), [1, 3])
+
+    def _load(self, name: str, data: bytes, workers: int = 1) -> 'project1.Simulation':
+        p = Path(name)
+        p.write_bytes(data)
+        try:
+            sim = project1.Simulation(project1.OutputSink(DummyIO()))
+            sim.load_file(p, workers)
+        finally:
+            p.unlink(missing_ok = True)
+        return sim
+
+    def _tables(self, sim) -> tuple:
+        return (sim.sim_length, list(sim.device_ids), list(sim._offsets), list(sim._targets),
+                list(sim._delays), sorted(sim._events))
+
+    def test_loading_in_small_chunks_matches_one_chunk(self):
+        data = b''.join(
+            b'# rule %d\r\nPROPAGATE %d %d %d\r\n  DEVICE %d  \rALERT %d M%d %d\n\n' % (i, i % 7, i % 5, i + 1, i, i % 7, i, i)
+            for i in range(300)) + b'LENGTH 500'
+        whole = self._tables(self._load('chunks.txt', data))
+        real_chunk_size = project1._CHUNK_SIZE
+        project1._CHUNK_SIZE = 64
+        try:
+            self.assertEqual(self._tables(self._load('chunks.txt', data)), whole)
+            self.assertEqual(self._tables(self._load('chunks.txt', data, workers = 2)), whole)
+        finally:
+            project1._CHUNK_SIZE = real_chunk_size
+        self.assertEqual(whole[0], 500)
+        self.assertEqual(len(whole[1]), 300)
+        self.assertEqual(len(whole[5]), 300)
+
+    def _run_loaded(self, sim) -> str:
+        buf = DummyIO()
+        sim.output = project1.OutputSink(buf)
+        sim.run()
+        return buf.getvalue()
+
+    def test_streamed_events_match_loaded_events(self):
+        data = (
+            b'LENGTH 200\n'
+            b'PROPAGATE 1 2 10\n'
+            b'ALERT 1 A 0\n'
+            b'ALERT 2 B 10\n'
+            b'PROPAGATE 2 3 5\n'
+            b'CANCEL 1 A 10\n'
+            b'# a comment\n'
+            b'ALERT 1 C 10\n'
+            b'PROPAGATE 3 1 20\n'
+            b'ALERT 3 D 150\n'
+        )
+        expected = self._run_loaded(self._load('stream.txt', data))
+        real_chunk_size = project1._STREAM_CHUNK_SIZE
+        project1._STREAM_CHUNK_SIZE = 16
+        try:
+            sim = project1.Simulation(project1.OutputSink(DummyIO()))
+            p = self._write_file('stream.txt', data.decode())
+            try:
+                sim.load_file(p, stream = True)
+                self.assertEqual(sim._events, [])
+                self.assertEqual(self._run_loaded(sim), expected)
+            finally:
+                p.unlink(missing_ok = True)
+        finally:
+            project1._STREAM_CHUNK_SIZE = real_chunk_size
+
+    def test_out_of_order_events_are_loaded_instead_of_streamed(self):
+        content = 'LENGTH 50\nPROPAGATE 1 2 10\nALERT 1 A 20\nALERT 1 B 0\n'
+        p = self._write_file('unsorted.txt', content)
+        try:
+            sim = project1.Simulation(project1.OutputSink(DummyIO()))
+            sim.load_file(p, stream = True)
+        finally:
+            p.unlink(missing_ok = True)
+        self.assertEqual(len(sim._events), 2)
+        self.assertEqual(self._run_loaded(sim).splitlines()[:2], ['@0: #1 SENT ALERT TO #2: B', '@10: #2 RECEIVED ALERT FROM #1: B'])
+
+    def test_resuming_from_snapshot_matches_uninterrupted_run(self):
+        content = (
+            'LENGTH 300\n'
+            'PROPAGATE 1 2 10\n'
+            'PROPAGATE 2 3 15\n'
+            'PROPAGATE 3 1 20\n'
+            'PROPAGATE 3 2 5\n'
+            'ALERT 1 X 0\n'
+            'ALERT 2 Y 30\n'
+            'CANCEL 3 X 70\n'
+            'ALERT 3 Z 150\n'
+            'CANCEL 1 Y 200\n'
+        )
+        p = self._write_file('snapshot.txt', content)
+        snapshot = Path('snapshot.snap')
+
+        class Killed(Exception):
+            pass
+
+        class KilledSimulation(project1.Simulation):
+            def save_snapshot(self, path):
+                super().save_snapshot(path)
+                if self.clock >= 100:
+                    raise Killed
+
+        try:
+            expected = io.StringIO()
+            sim = project1.Simulation(project1.OutputSink(expected))
+            sim.load_file(p)
+            sim.run()
+
+            for stream in (False, True):
+                before = io.StringIO()
+                killed = KilledSimulation(project1.OutputSink(before, buffer_lines = 4),
+                                          snapshot_path = snapshot, snapshot_interval = 50)
+                killed.load_file(p, stream = stream)
+                with self.assertRaises(Killed):
+                    killed.run()
+
+                after = io.StringIO()
+                resumed = project1.Simulation(project1.OutputSink(after))
+                resumed.load_file(p, stream = not stream)
+                written = resumed.restore_snapshot(snapshot)
+                self.assertEqual(resumed.clock, 100)
+                resumed.run()
+
+                output = ''.join(before.getvalue().splitlines(True)[:written]) + after.getvalue()
+                self.assertEqual(output, expected.getvalue())
+                self.assertEqual((resumed.canceled, resumed.cancel_time, resumed.cancel_sources),
+                                 (sim.canceled, sim.cancel_time, sim.cancel_sources))
+        finally:
+            p.unlink(missing_ok = True)
+            snapshot.unlink(missing_ok = True)
+
+    def test_snapshot_of_another_scenario_is_rejected(self):
+        snapshot = Path('other.snap')
+        try:
+            sim = self._load('first.txt', b'LENGTH 10\nPROPAGATE 1 2 3\nALERT 1 X 0\n')
+            sim.save_snapshot(snapshot)
+            other = self._load('second.txt', b'LENGTH 20\nPROPAGATE 1 2 3\n')
+            with self.assertRaises(ValueError):
+                other.restore_snapshot(snapshot)
+            snapshot.write_bytes(b'not a snapshot')
+            with self.assertRaises(ValueError):
+                sim.restore_snapshot(snapshot)
+        finally:
+            snapshot.unlink(missing_ok = True)
+
+    def test_truncated_or_corrupt_snapshot_is_rejected(self):
+        snapshot = Path('damaged.snap')
+        try:
+            sim = self._load('damaged.txt', b'LENGTH 10\nPROPAGATE 1 2 3\nALERT 1 X 0\n')
+            sim.save_snapshot(snapshot)
+            data = snapshot.read_bytes()
+            magic = project1._SNAPSHOT_MAGIC
+            for damaged in (data[:len(data) // 2],
+                            magic + zlib.compress(b'not a pickle'),
+                            magic + zlib.compress(pickle.dumps(['not', 'a', 'snapshot']))):
+                snapshot.write_bytes(damaged)
+                with self.assertRaises(ValueError):
+                    sim.restore_snapshot(snapshot)
+        finally:
+            snapshot.unlink(missing_ok = True)
+
+    def test_snapshot_interval_must_be_positive(self):
+        for interval in (0, -5):
+            with self.assertRaises(ValueError):
+                project1.Simulation(snapshot_path = Path('never.snap'), snapshot_interval = interval)
+
+    def test_empty_file_runs_to_end(self):
+        sim = self._load('empty.txt', b'')
+        buf = DummyIO()
+        sim.output = project1.OutputSink(buf)
+        sim.run()
+        self.assertEqual(buf.getvalue(), '@0: END\n')
+
+    def test_malformed_number_reports_file_not_found(self):
+        p = self._write_file('malformed.txt', 'LENGTH 10\nDEVICE 1\nPROPAGATE 1 2 soon\n')
+        try:
+            sim = project1.Simulation(project1.OutputSink(DummyIO()))
+            out = self.capture_stdout(sim.load_file, p)
+        finally:
+            p.unlink(missing_ok = True)
+        self.assertEqual(out, 'FILE NOT FOUND\n')
+
+
+    def _run_parallel(self, content: str, processes: int, partition = None) -> tuple:
+        p = self._write_file('parallel.txt', content)
+        try:
+            out = io.StringIO()
+            sim = project1.Simulation(project1.OutputSink(out))
+            sim.load_file(p)
+            if processes is None:
+                sim.run()
+            else:
+                parallel.run_parallel(sim, processes, partition)
+        finally:
+            p.unlink(missing_ok = True)
+        return out.getvalue(), dict(sim.canceled), dict(sim.cancel_time), dict(sim.cancel_sources)
+
+    def test_parallel_run_matches_sequential_run(self):
+        content = (
+            'LENGTH 150\n'
+            'DEVICE 1\n'
+            'DEVICE 2\n'
+            'DEVICE 3\n'
+            'DEVICE 4\n'
+            'PROPAGATE 1 2 10\n'
+            'PROPAGATE 2 1 10\n'
+            'PROPAGATE 2 3 30\n'
+            'PROPAGATE 3 4 10\n'
+            'PROPAGATE 4 3 10\n'
+            'PROPAGATE 4 1 30\n'
+            'PROPAGATE 1 3 30\n'
+            'ALERT 1 X 0\n'
+            'ALERT 3 Y 0\n'
+            'ALERT 4 Z 20\n'
+            'CANCEL 2 X 60\n'
+            'CANCEL 4 Y 70\n'
+        )
+        expected = self._run_parallel(content, None)
+        self.assertEqual(self._run_parallel(content, 2), expected)
+        self.assertEqual(self._run_parallel(content, 3), expected)
+        self.assertEqual(self._run_parallel(content, 2, {1: 0, 3: 0, 2: 1, 4: 1}), expected)
+
+    def test_profiler_summarizes_run_without_changing_output(self):
+        content = (
+            'LENGTH 50\n'
+            'PROPAGATE 1 2 10\n'
+            'PROPAGATE 1 3 10\n'
+            'PROPAGATE 2 1 10\n'
+            'ALERT 1 X 0\n'
+            'CANCEL 1 X 15\n'
+        )
+        plain = io.StringIO()
+        self._run_with_output('profile.txt', content, project1.OutputSink(plain))
+
+        summary_file = io.StringIO()
+        profiler = project1.Profiler(summary_file, sample_every = 1, progress_interval = 0)
+        p = self._write_file('profile.txt', content)
+        real_stderr = sys.stderr
+        sys.stderr = progress = DummyIO()
+        try:
+            out = io.StringIO()
+            sim = project1.Simulation(project1.OutputSink(out), profiler = profiler)
+            sim.load_file(p)
+            sim.run()
+        finally:
+            sys.stderr = real_stderr
+            p.unlink(missing_ok = True)
+
+        self.assertEqual(out.getvalue(), plain.getvalue())
+        summary = json.loads(summary_file.getvalue())
+        self.assertEqual(summary, profiler.summary)
+        self.assertEqual(summary['events_by_kind'], {'send_alert': 1, 'recv_alert': 3, 'send_cancel': 1, 'recv_cancel': 3})
+        self.assertEqual(summary['events'], 8)
+        self.assertEqual(summary['messages_sent_by_device'], {'1': 4, '2': 2})
+        self.assertEqual(summary['rules_by_device'], {'1': 2, '2': 1})
+        self.assertEqual(len(summary['queue_depth']), 8)
+        self.assertGreaterEqual(summary['max_queue_depth'], 2)
+        self.assertEqual(len(progress.getvalue().splitlines()), 8)
+        self.assertNotIn('_handle', vars(sim))
+
+    def test_progress_is_reported_between_samples(self):
+        content = (
+            'LENGTH 50\n'
+            'PROPAGATE 1 2 10\n'
+            'PROPAGATE 2 1 10\n'
+            'ALERT 1 X 0\n'
+        )
+        profiler = project1.Profiler(io.StringIO(), sample_every = 1000, progress_interval = 0)
+        p = self._write_file('progress.txt', content)
+        real_stderr = sys.stderr
+        sys.stderr = progress = DummyIO()
+        try:
+            sim = project1.Simulation(project1.OutputSink(io.StringIO()), profiler = profiler)
+            sim.load_file(p)
+            sim.run()
+        finally:
+            sys.stderr = real_stderr
+            p.unlink(missing_ok = True)
+
+        self.assertEqual(profiler.summary['queue_depth'], [])
+        self.assertEqual(len(progress.getvalue().splitlines()), profiler.summary['events'])
+
+    def test_profiler_finishes_when_run_raises(self):
+        content = (
+            'LENGTH 50\n'
+            'PROPAGATE 1 2 10\n'
+            'ALERT 1 X 0\n'
+        )
+
+        class FailingSimulation(project1.Simulation):
+            def _handle(self, t, kind, sender, payload):
+                if kind == 'recv_alert':
+                    raise RuntimeError('failed')
+                super()._handle(t, kind, sender, payload)
+
+        summary_file = io.StringIO()
+        profiler = project1.Profiler(summary_file)
+        p = self._write_file('profile_fail.txt', content)
+        try:
+            sim = FailingSimulation(project1.OutputSink(io.StringIO()), profiler = profiler)
+            sim.load_file(p)
+            with self.assertRaises(RuntimeError):
+                sim.run()
+        finally:
+            p.unlink(missing_ok = True)
+
+        for name in ('_handle', '_add_event', '_log_event'):
+            self.assertNotIn(name, vars(sim))
+        self.assertEqual(json.loads(summary_file.getvalue())['events_by_kind'], {'send_alert': 1})
+
+    def test_parallel_run_rejects_profiler_and_snapshots(self):
+        for options in ({'profiler': project1.Profiler(io.StringIO())},
+                        {'snapshot_path': Path('parallel.snap'), 'snapshot_interval': 10}):
+            sim = project1.Simulation(project1.OutputSink(io.StringIO()), **options)
+            with self.assertRaises(ValueError):
+                parallel.run_parallel(sim, 2)
+
+    def test_partition_groups_devices_joined_by_short_delays(self):
+        p = self._write_file('partition.txt', (
+            'LENGTH 100\n'
+            'PROPAGATE 1 2 5\n'
+            'PROPAGATE 2 1 5\n'
+            'PROPAGATE 3 4 5\n'
+            'PROPAGATE 4 3 5\n'
+            'PROPAGATE 2 3 50\n'
+            'PROPAGATE 4 1 50\n'
+        ))
+        try:
+            sim = project1.Simulation(project1.OutputSink(DummyIO()))
+            sim.load_file(p)
+        finally:
+            p.unlink(missing_ok = True)
+        partition = parallel._partition_devices(sim, 2)
+        self.assertEqual(partition[1], partition[2])
+        self.assertEqual(partition[3], partition[4])
+        self.assertNotEqual(partition[1], partition[3])
+        self.assertEqual(parallel._window_length(sim, partition), 50)
+
 
 if __name__ == '__main__':
     unittest.main()